@@ -1,33 +1,60 @@
-from flask import Flask, request, jsonify, send_file, render_template, send_file
+from flask import Flask, request, jsonify, send_file, render_template
 import os
 import uuid
-import cv2
-import pandas as pd
-from io import BytesIO
 import base64
+import time
 
-from utils import (
-    read_video, save_video, measure_distance,
-    draw_player_stats, convert_pixel_distance_to_meters
-)
-import constants
-from trackers import PlayerTracker, BallTracker
-from court_line_detector import CourtLineDetector
-from mini_court import MiniCourt
-from copy import deepcopy
+from detection_cache import DetectionCache
+from job_queue import JobQueue
+from model_pool import ModelPool
+from instrumentation import PipelineMetrics, LATENCY_BUCKETS_MS, get_peak_rss_mb
 
 app = Flask(__name__)
 
-def extract_last_frame(video_path):
-    cap = cv2.VideoCapture(video_path)
-    last_frame = None
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        last_frame = frame
-    cap.release()
-    return last_frame
+# same cache directory as main.py, so detections are shared with CLI runs
+detection_cache = DetectionCache()
+# shot frames returned as thumbnails with each result
+KEYFRAME_THUMBNAILS = 4
+
+def run_analysis_job(input_path, output_path, progress_callback=None):
+    from main import main as process_video
+
+    # PROFILE_STAGE=<stage> profiles that stage of every job into jobs/<video>.<stage>.prof
+    metrics = PipelineMetrics()
+    if profile_stage:
+        video_name = os.path.splitext(os.path.basename(output_path))[0]
+        metrics = PipelineMetrics(profile_stage=profile_stage,
+                                  profile_output=os.path.join("jobs", f"{video_name}.{profile_stage}.prof"))
+
+    with model_pool.acquire() as models:
+        results = process_video(input_path, output_path, detection_cache=detection_cache,
+                                progress_callback=progress_callback, models=models, metrics=metrics,
+                                num_keyframe_thumbnails=KEYFRAME_THUMBNAILS)
+    output_path = results['output_video_path']
+
+    # the last rendered frame and shot thumbnails, already encoded by the pipeline
+    return {
+        "video_url": f"/download/{output_path}",
+        "image_base64": base64.b64encode(results['preview']['jpeg']).decode("utf-8"),
+        "keyframes": [
+            {"frame_num": keyframe['frame_num'], "image_base64": base64.b64encode(keyframe['jpeg']).decode("utf-8")}
+            for keyframe in results['keyframes']
+        ],
+        # per-player totals and one record per shot
+        "stats": results['stats'],
+        "metrics": results['metrics']
+    }
+
+
+# analyses run on background workers; ANALYSIS_WORKERS caps how many videos
+# are processed at once, and each worker gets its own set of warm models
+analysis_workers = int(os.environ.get("ANALYSIS_WORKERS", 1))
+profile_stage = os.environ.get("PROFILE_STAGE")
+started_at = time.time()
+model_pool = ModelPool(pool_size=analysis_workers)
+# finished jobs' results are read back from jobs/ on request; their metrics stay in memory for /metrics
+job_queue = JobQueue(run_analysis_job, num_workers=analysis_workers, jobs_dir="jobs",
+                     max_finished_jobs=int(os.environ.get("MAX_FINISHED_JOBS", 100)), keep_result_keys=("metrics",))
 
 
 @app.route("/")
@@ -49,20 +76,99 @@ def analyze_video():
 
     video_file.save(input_path)
 
-    from main import main as process_video
-    process_video(input_path, output_path)
+    job = job_queue.submit(input_path, output_path)
+
+    # return immediately; the client polls the status URL until the job is done
+    return jsonify({
+        "message": "Processing started",
+        "job_id": job.job_id,
+        "status_url": f"/jobs/{job.job_id}",
+        "progress_url": f"/jobs/{job.job_id}/progress",
+        "result_url": f"/jobs/{job.job_id}/result"
+    }), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/progress")
+def job_progress(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({
+        "status": job.status,
+        "stage": job.stage,
+        "frames_processed": job.frames_processed,
+        "total_frames": job.total_frames,
+        "progress": job.get_progress(),
+        "eta_seconds": job.get_eta_seconds()
+    })
 
-    # extract image frame
-    final_frame = extract_last_frame(output_path)
-    _, buffer = cv2.imencode(".jpg", final_frame)
-    output_image_base64 = base64.b64encode(buffer).decode("utf-8")
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status == "failed":
+        return jsonify({"error": job.error, "status": job.status}), 500
+    if job.status != "done":
+        return jsonify({"error": "Job not finished", "status": job.status}), 409
 
     # return frontend video URL + image + stats
+    return jsonify({"message": "Processing completed", **job_queue.get_result(job)})
+
+
+@app.route("/metrics")
+def metrics():
+    # timings of finished jobs can reveal what is being uploaded; local callers only
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Metrics are only available locally"}), 403
+
+    with job_queue.lock:
+        jobs = list(job_queue.jobs.values())
+    done_jobs = sorted(
+        (job for job in jobs if job.status == "done" and job.result_summary is not None),
+        key=lambda job: job.finished_at
+    )
+
+    # totals over every finished job; latency histograms add up bucket by bucket
+    stages = {}
+    latency_counts = {}
+    for job in done_jobs:
+        job_metrics = job.result_summary['metrics']
+        for name, stage in job_metrics['stages'].items():
+            total = stages.setdefault(name, {'seconds': 0.0, 'frames': 0})
+            total['seconds'] += stage['seconds']
+            total['frames'] += stage['frames']
+        for name, latency in job_metrics['latency_ms'].items():
+            counts = latency_counts.setdefault(name, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+            for bucket, count in enumerate(latency['histogram']['counts']):
+                counts[bucket] += count
+    for stage in stages.values():
+        stage['fps'] = stage['frames'] / stage['seconds'] if stage['frames'] and stage['seconds'] > 0 else None
+
+    statuses = [job.status for job in jobs]
     return jsonify({
-        "message": "Processing completed",
-        "video_url": f"/download/{output_path}",
-        "image_base64": output_image_base64,
-        "stats": "OK"
+        "uptime_seconds": time.time() - started_at,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "analysis_workers": analysis_workers,
+        "jobs": {status: statuses.count(status) for status in ("queued", "running", "done", "failed")},
+        "stages": stages,
+        "latency_histograms": {
+            name: {"buckets_ms": list(LATENCY_BUCKETS_MS), "counts": counts}
+            for name, counts in latency_counts.items()
+        },
+        "recent_jobs": [
+            {"job_id": job.job_id, **{key: job.result_summary['metrics'][key] for key in ("frames", "wall_seconds", "fps", "peak_rss_mb")}}
+            for job in done_jobs[-10:]
+        ],
     })
 
 
@@ -1,58 +1,312 @@
-import pickle
 import pandas as pd
 import numpy as np
 import cv2
 from ultralytics import YOLO
-
+from track_store import TrackStore
+from instrumentation import measure
+
+# adaptive stride: look at every frame while the detection is weaker than
+# this, or while the ball strays more than this many box sizes from where
+# its last velocity put it
+STRIDE_MIN_CONFIDENCE = 0.5
+STRIDE_MAX_PREDICTION_ERROR = 1.0
+# YOLO input sizes are multiples of the model's largest stride
+MODEL_STRIDE = 32
+
+
+def get_roi_imgsz(roi_size):
+    # the smallest valid input size holding the whole crop, so it isn't upscaled to the default 640
+    return int(np.ceil(roi_size / MODEL_STRIDE) * MODEL_STRIDE)
+
+
+class BallKalmanFilter:
+    """
+    Online estimate of the ball's position and velocity, updated one frame
+    at a time with step(). The state per axis is [position, velocity]
+    (model='velocity') or [position, velocity, acceleration]
+    (model='acceleration'), with one frame as the time step.
+
+    Box centres are the measurements. One whose squared Mahalanobis distance
+    from the prediction is above gate_threshold (chi-squared, 2 dof, 99%) is
+    rejected as an outlier, unless the last max_rejected were rejected too,
+    in which case the ball really moved (e.g. was hit) and the filter starts
+    over there. After max_missed frames without an accepted measurement the
+    ball is lost until the next detection.
+    """
+    def __init__(self, model='acceleration', process_noise=1.0, measurement_noise=2.0,
+                 gate_threshold=9.21, max_rejected=3, max_missed=10):
+        axis_transition, axis_noise = {
+            'velocity': (
+                np.array([[1, 1], [0, 1]]),
+                np.array([[1/4, 1/2], [1/2, 1]]),
+            ),
+            'acceleration': (
+                np.array([[1, 1, 1/2], [0, 1, 1], [0, 0, 1]]),
+                np.array([[1/4, 1/2, 1/2], [1/2, 1, 1], [1/2, 1, 1]]),
+            ),
+        }[model]
+        # state is [x, vx, (ax), y, vy, (ay)]
+        self.axis_size = len(axis_transition)
+        self.transition = np.kron(np.eye(2), axis_transition)
+        self.process_covariance = np.kron(np.eye(2), axis_noise) * process_noise
+        self.observation = np.zeros((2, 2 * self.axis_size))
+        self.observation[0, 0] = 1
+        self.observation[1, self.axis_size] = 1
+        self.measurement_covariance = np.eye(2) * measurement_noise ** 2
+        # starting uncertainty per axis: measurement noise on the position, up
+        # to ~40 px/frame of speed, a few px/frame^2 of acceleration
+        self.initial_variances = np.tile([measurement_noise ** 2, 20.0 ** 2, 5.0 ** 2][:self.axis_size], 2)
+
+        self.gate_threshold = gate_threshold
+        self.max_rejected = max_rejected
+        self.max_missed = max_missed
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.covariance = None
+        self.box_size = None
+        self.missed = 0
+        self.rejected = 0
+
+    @property
+    def is_tracking(self):
+        return self.state is not None
+
+    def initialize(self, center, box_size):
+        self.state = np.zeros(2 * self.axis_size)
+        self.state[0], self.state[self.axis_size] = center
+        self.covariance = np.diag(self.initial_variances)
+        self.box_size = box_size
+        self.missed = 0
+        self.rejected = 0
+
+    def step(self, bbox=None):
+        """
+        Advance one frame and feed its detection ([x1, y1, x2, y2] or None).
+        Returns 'measured', 'rejected', 'predicted', 'restarted' or 'lost'.
+        """
+        if self.state is not None:
+            self.state = self.transition @ self.state
+            self.covariance = self.transition @ self.covariance @ self.transition.T + self.process_covariance
+
+        if bbox is None:
+            return self.miss('predicted')
+
+        x1, y1, x2, y2 = bbox
+        center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+        box_size = np.array([x2 - x1, y2 - y1])
+        if self.state is None:
+            self.initialize(center, box_size)
+            return 'measured'
+
+        innovation = center - self.observation @ self.state
+        innovation_covariance = self.observation @ self.covariance @ self.observation.T + self.measurement_covariance
+        if innovation @ np.linalg.solve(innovation_covariance, innovation) > self.gate_threshold:
+            self.rejected += 1
+            if self.rejected >= self.max_rejected:
+                self.initialize(center, box_size)
+                return 'restarted'
+            return self.miss('rejected')
+
+        gain = self.covariance @ self.observation.T @ np.linalg.inv(innovation_covariance)
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(len(self.state)) - gain @ self.observation) @ self.covariance
+        self.box_size = 0.7 * self.box_size + 0.3 * box_size
+        self.missed = 0
+        self.rejected = 0
+        return 'measured'
+
+    def miss(self, status):
+        if self.state is None:
+            return 'lost'
+        self.missed += 1
+        if self.missed > self.max_missed:
+            self.reset()
+            return 'lost'
+        return status
+
+    @property
+    def position(self):
+        return None if self.state is None else self.state[[0, self.axis_size]]
+
+    @property
+    def velocity(self):
+        return None if self.state is None else self.state[[1, self.axis_size + 1]]
+
+    def get_bbox(self):
+        if self.state is None:
+            return None
+        half_size = self.box_size / 2
+        return np.concatenate([self.position - half_size, self.position + half_size])
 
 class BallTracker:
-    def __init__(self, model_path):
+    def __init__(self, model_path, conf=0.15, imgsz=None):
+        self.model_path = model_path
         self.model = YOLO(model_path)
 
+        self.inference_params = {'conf': conf}
+        if imgsz is not None:
+            self.inference_params['imgsz'] = imgsz
+
+        self.reset()
+
+    def reset(self):
+        # adaptive stride / ROI state and inference counts are per video
+        self.frames_seen = 0
+        self.frames_detected = 0
+        self.roi_calls = 0
+        self.full_frame_calls = 0
+        self.next_detection_frame = 0
+        self.stride = 1
+        self.stride_history = []
+        # every accepted detection, for predicting the ROI; unlike stride_history not gated on confidence
+        self.roi_history = []
+        self.ball_filter = BallKalmanFilter()
+        # PipelineMetrics of the video being processed, set by main; None records nothing
+        self.metrics = None
+
     # =======================================================
     #   SAFE INTERPOLATION - NEVER CRASHES
     # =======================================================
-    def interpolate_ball_positions(self, ball_positions):
+    def interpolate_ball_positions(self, ball_positions, max_gap=None):
 
-        cleaned = []
+        ball_boxes = self.get_ball_position_array(ball_positions)
+        valid = np.isfinite(ball_boxes).all(axis=1)
 
-        for frame in ball_positions:
-
-            # Case 1: valid dict containing ball
-            if isinstance(frame, dict):
-                if 1 in frame and isinstance(frame[1], list) and len(frame[1]) == 4:
-                    cleaned.append(frame[1])
-                    continue
-                if "ball" in frame and isinstance(frame["ball"], list) and len(frame["ball"]) == 4:
-                    cleaned.append(frame["ball"])
-                    continue
+        # If everything is NaN: no ball found at all
+        if not valid.any():
+            print("⚠️ No ball positions found — interpolation skipped.")
+            return [{1: None} for _ in range(len(ball_boxes))]
 
-            # Case 2: list formatted correctly
-            if isinstance(frame, list):
-                if len(frame) == 4:
-                    cleaned.append(frame)
-                    continue
-                if len(frame) == 1 and isinstance(frame[0], list) and len(frame[0]) == 4:
-                    cleaned.append(frame[0])
-                    continue
+        # ---- Interpolate missing values ----
+        ball_boxes, valid = self.interpolate_ball_array(ball_boxes, valid, max_gap=max_gap)
 
-            # Fall-back for any bad case
-            cleaned.append([np.nan, np.nan, np.nan, np.nan])
+        # ---- Convert back ----
+        return [{1: box} if is_valid else {1: None}
+                for box, is_valid in zip(ball_boxes.tolist(), valid.tolist())]
 
-        # ---- Convert to DataFrame ----
-        df = pd.DataFrame(cleaned, columns=['x1', 'y1', 'x2', 'y2']).astype(float)
+    def interpolate_ball_track(self, ball_detections, max_gap=None):
+        """
+        TrackStore version: returns a TrackStore with one row per frame for
+        ball 1, where rows the interpolation did not fill are invalid.
+        """
+        ball_boxes, valid = ball_detections.get_dense_track(1)
 
-        # If everything is NaN: no ball found at all
-        if df.isnull().all().all():
+        if not valid.any():
             print("⚠️ No ball positions found — interpolation skipped.")
-            return [{1: None} for _ in cleaned]
+            return TrackStore.from_dense(1, ball_boxes, valid)
 
-        # ---- Interpolate missing values ----
-        df = df.interpolate().bfill()
+        ball_boxes, valid = self.interpolate_ball_array(ball_boxes, valid, max_gap=max_gap)
+        return TrackStore.from_dense(1, ball_boxes, valid)
 
-        # ---- Convert back ----
-        final_positions = [{1: row.tolist()} for _, row in df.iterrows()]
-        return final_positions
+    # =======================================================
+    #   ONLINE KALMAN SMOOTHING
+    # =======================================================
+    def update_ball_filter(self, bbox=None):
+        """
+        Streaming use: feed the next frame's ball box (or None) to the
+        tracker's filter and get that frame's estimate right away, as
+        {'status', 'bbox', 'position', 'velocity'}; the last three are None
+        while the ball is lost. Velocity is in pixels per frame.
+        """
+        status = self.ball_filter.step(bbox)
+        if not self.ball_filter.is_tracking:
+            return {'status': status, 'bbox': None, 'position': None, 'velocity': None}
+        return {
+            'status': status,
+            'bbox': self.ball_filter.get_bbox().tolist(),
+            'position': self.ball_filter.position.tolist(),
+            'velocity': self.ball_filter.velocity.tolist(),
+        }
+
+    def filter_ball_track(self, ball_detections, **filter_params):
+        """
+        Run the online filter over a whole TrackStore of ball detections, the
+        causal alternative to interpolate_ball_track: every frame's estimate
+        only depends on the frames before it. Returns a TrackStore with one
+        row per frame for ball 1 (invalid while the ball is lost) and the
+        (N, 2) per-frame velocities.
+        """
+        ball_filter = BallKalmanFilter(**filter_params)
+        ball_boxes, present = ball_detections.get_dense_track(1)
+        filtered_boxes = np.full((len(ball_boxes), 4), np.nan)
+        velocities = np.full((len(ball_boxes), 2), np.nan)
+
+        for frame_num, (bbox, is_present) in enumerate(zip(ball_boxes, present)):
+            ball_filter.step(bbox if is_present else None)
+            if ball_filter.is_tracking:
+                filtered_boxes[frame_num] = ball_filter.get_bbox()
+                velocities[frame_num] = ball_filter.velocity
+
+        return TrackStore.from_dense(1, filtered_boxes), velocities
+
+    def get_ball_position_array(self, ball_positions):
+        """
+        Convert per-frame ball detections into a contiguous (N, 4) float array.
+        Frames without a usable box are rows of NaN.
+        """
+        ball_boxes = np.full((len(ball_positions), 4), np.nan)
+
+        for frame_num, frame in enumerate(ball_positions):
+
+            box = None
+
+            # Case 1: valid dict containing ball
+            if isinstance(frame, dict):
+                if 1 in frame and isinstance(frame[1], list) and len(frame[1]) == 4:
+                    box = frame[1]
+                elif "ball" in frame and isinstance(frame["ball"], list) and len(frame["ball"]) == 4:
+                    box = frame["ball"]
+
+            # Case 2: list formatted correctly
+            elif isinstance(frame, list):
+                if len(frame) == 4:
+                    box = frame
+                elif len(frame) == 1 and isinstance(frame[0], list) and len(frame[0]) == 4:
+                    box = frame[0]
+
+            # Anything else stays NaN
+            if box is not None:
+                ball_boxes[frame_num] = box
+
+        return ball_boxes
+
+    def interpolate_ball_array(self, ball_boxes, valid=None, max_gap=None):
+        """
+        Linearly interpolate an (N, 4) array of ball boxes over the frames where
+        'valid' is False. Leading and trailing gaps take the nearest detection,
+        the same as interpolate().bfill().
+
+        With max_gap set, only gaps of at most max_gap frames are filled and
+        longer ones are left as NaN. Returns the filled array and its new
+        validity mask.
+        """
+        ball_boxes = np.asarray(ball_boxes, dtype=float)
+        if valid is None:
+            valid = np.isfinite(ball_boxes).all(axis=1)
+
+        num_frames = len(ball_boxes)
+        interpolated = np.full((num_frames, 4), np.nan)
+        if not valid.any():
+            return interpolated, valid.copy()
+
+        frame_nums = np.arange(num_frames)
+        valid_frame_nums = frame_nums[valid]
+        for column in range(4):
+            interpolated[:, column] = np.interp(frame_nums, valid_frame_nums, ball_boxes[valid, column])
+
+        if max_gap is None:
+            return interpolated, np.ones(num_frames, dtype=bool)
+
+        # length of the run of missing frames each frame belongs to
+        previous_valid = np.maximum.accumulate(np.where(valid, frame_nums, -1))
+        next_valid = np.minimum.accumulate(np.where(valid, frame_nums, num_frames)[::-1])[::-1]
+        gap_length = next_valid - previous_valid - 1
+
+        filled = valid | (gap_length <= max_gap)
+        interpolated[~filled] = np.nan
+        return interpolated, filled
 
     # =======================================================
     #   BALL SHOT FRAME DETECTION
@@ -69,7 +323,15 @@ class BallTracker:
 
             cleaned.append([np.nan, np.nan, np.nan, np.nan])
 
-        df = pd.DataFrame(cleaned, columns=['x1', 'y1', 'x2', 'y2']).astype(float)
+        return self.get_ball_shot_frames_from_array(np.asarray(cleaned, dtype=float).reshape(-1, 4))
+
+    def get_ball_shot_frames_from_track(self, ball_detections):
+        ball_boxes, _ = ball_detections.get_dense_track(1)
+        return self.get_ball_shot_frames_from_array(ball_boxes)
+
+    def get_ball_shot_frames_from_array(self, ball_boxes):
+
+        df = pd.DataFrame(ball_boxes, columns=['x1', 'y1', 'x2', 'y2']).astype(float)
 
         # If no detection → skip hit detection
         if df.isnull().all().all():
@@ -81,56 +343,250 @@ class BallTracker:
         df['mid_y_avg'] = df['mid_y'].rolling(window=5, min_periods=1).mean()
         df['delta_y'] = df['mid_y_avg'].diff()
 
-        hit_frames = []
-        threshold = 25
+        return self.find_shot_frames(df['delta_y'].to_numpy())
 
-        for i in range(1, len(df) - int(threshold * 1.2)):
+    def find_shot_frames(self, delta_y, threshold=25):
+        """
+        A frame i is a hit when delta_y changes sign between i and i+1 and the
+        new sign holds for at least 'threshold' of the next threshold*1.2 frames.
+        Window counts come from cumulative sums, so this is O(N).
+        """
+        delta_y = np.asarray(delta_y, dtype=float)
+        window = int(threshold * 1.2)
 
-            upward = df['delta_y'].iloc[i] < 0 and df['delta_y'].iloc[i + 1] > 0
-            downward = df['delta_y'].iloc[i] > 0 and df['delta_y'].iloc[i + 1] < 0
+        # NaN compares False in both masks, same as the scalar comparisons
+        positive = delta_y > 0
+        negative = delta_y < 0
 
-            if upward or downward:
+        frames = np.arange(1, len(delta_y) - window)
+        if len(frames) == 0:
+            return []
+
+        upward = negative[frames] & positive[frames + 1]
+        downward = positive[frames] & negative[frames + 1]
 
-                count = 0
-                for j in range(i+1, i + int(threshold * 1.2) + 1):
-                    if upward and df['delta_y'].iloc[j] > 0:
-                        count += 1
-                    if downward and df['delta_y'].iloc[j] < 0:
-                        count += 1
+        # counts over j in [i+1, i+window]
+        positive_cumsum = np.concatenate(([0], np.cumsum(positive)))
+        negative_cumsum = np.concatenate(([0], np.cumsum(negative)))
+        positive_count = positive_cumsum[frames + window + 1] - positive_cumsum[frames + 1]
+        negative_count = negative_cumsum[frames + window + 1] - negative_cumsum[frames + 1]
 
-                if count > threshold - 1:
-                    hit_frames.append(i)
+        count = np.where(upward, positive_count, 0) + np.where(downward, negative_count, 0)
+        hit_frames = frames[(upward | downward) & (count > threshold - 1)]
 
-        return hit_frames
+        return hit_frames.tolist()
 
     # =======================================================
-    #   STUB OR YOLO DETECTION
+    #   YOLO DETECTION
     # =======================================================
-    def detect_frames(self, frames, read_from_stub=False, stub_path=None):
+    def detect_frames(self, frames, batch_size=1, max_stride=1, roi_size=None):
+
+        if max_stride > 1 or roi_size is not None:
+            return self.detect_frames_tracked(frames, max_stride, roi_size)
 
-        if read_from_stub and stub_path is not None:
-            with open(stub_path, "rb") as f:
-                print("👉 Loaded ball stubs!")
-                return pickle.load(f)
+        frame_arrays = []
 
-        ball_detections = []
+        # one model call per batch of frames instead of per frame
+        for batch_start in range(0, len(frames), batch_size):
+            batch_frames = frames[batch_start:batch_start + batch_size]
+            frame_arrays.extend(self.detect_batch(batch_frames))
+
+        self.frames_seen += len(frames)
+        self.frames_detected += len(frames)
+        self.full_frame_calls += len(frames)
+        return TrackStore.from_frame_arrays(frame_arrays)
+
+    # =======================================================
+    #   ADAPTIVE STRIDE / PREDICTED ROI
+    # =======================================================
+    def detect_frames_tracked(self, frames, max_stride=1, roi_size=None):
+        """
+        Detection that follows the ball from frame to frame.
+
+        With max_stride > 1 the model only runs every 'stride' frames, where
+        the stride doubles up to max_stride while the ball moves predictably
+        and drops back to 1 when it is lost, weakly detected, off its
+        predicted path, or about to change vertical direction. Skipped frames
+        get no detection and are filled later by interpolate_ball_track, so
+        max_stride is the single accuracy/throughput knob.
+
+        With roi_size set the model only sees a roi_size x roi_size crop
+        around the position predicted from recent motion (see
+        detect_ball_in_roi), falling back to the full frame when the ball is
+        not found there.
+
+        Each call depends on the previous detections, so frames go to the
+        model one at a time. The state carries over between chunks of the
+        same video; call reset() between videos.
+        """
+        no_detection = (np.empty(0, np.int64), np.empty((0, 4)), np.empty(0, np.float32))
+        frame_arrays = []
 
         for frame in frames:
-            ball_detections.append(self.detect_frame(frame))
+            frame_num = self.frames_seen
+            self.frames_seen += 1
+            if frame_num < self.next_detection_frame:
+                frame_arrays.append(no_detection)
+                continue
+
+            if roi_size is not None:
+                frame_array = self.detect_ball_in_roi(frame, frame_num, roi_size)
+            else:
+                frame_array = self.detect_batch([frame])[0]
+                self.full_frame_calls += 1
+            self.frames_detected += 1
+            frame_arrays.append(frame_array)
+            self.update_roi_history(frame_num, frame_array)
+            self.next_detection_frame = frame_num + self.get_next_stride(frame_num, frame_array, max_stride)
+
+        return TrackStore.from_frame_arrays(frame_arrays)
+
+    def get_next_stride(self, frame_num, frame_array, max_stride):
+        _, bboxes, confidences = frame_array
+        if len(bboxes) == 0 or confidences[0] < STRIDE_MIN_CONFIDENCE:
+            # start over from dense detections until the ball is found again
+            self.stride_history = []
+            self.stride = 1
+            return self.stride
+
+        x1, y1, x2, y2 = bboxes[0]
+        center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+        size = max(x2 - x1, y2 - y1, 1.0)
+        self.stride_history = (self.stride_history + [(frame_num, center)])[-3:]
+        if len(self.stride_history) < 3:
+            self.stride = 1
+            return self.stride
+
+        # velocities (per frame) over the last two steps
+        (frame_0, center_0), (frame_1, center_1), (frame_2, center_2) = self.stride_history
+        velocity_1 = (center_1 - center_0) / (frame_1 - frame_0)
+        velocity_2 = (center_2 - center_1) / (frame_2 - frame_1)
+        predicted = center_1 + velocity_1 * (frame_2 - frame_1)
+        prediction_error = np.linalg.norm(center_2 - predicted) / size
+
+        if prediction_error > STRIDE_MAX_PREDICTION_ERROR or velocity_1[1] * velocity_2[1] < 0:
+            self.stride = 1
+            return self.stride
+        self.stride = min(self.stride * 2, max_stride)
+
+        # don't step past the frame where the vertical motion is predicted to turn
+        acceleration_y = (velocity_2[1] - velocity_1[1]) / ((frame_2 - frame_0) / 2)
+        if acceleration_y * velocity_2[1] < 0:
+            frames_to_turn = -velocity_2[1] / acceleration_y
+            self.stride = max(1, min(self.stride, int(frames_to_turn / 2)))
+        return self.stride
+
+    def update_roi_history(self, frame_num, frame_array):
+        _, bboxes, _ = frame_array
+        if len(bboxes) == 0:
+            self.roi_history = []
+            return
+        x1, y1, x2, y2 = bboxes[0]
+        center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+        self.roi_history = (self.roi_history + [(frame_num, center)])[-2:]
+
+    def predict_ball_center(self, frame_num):
+        # constant velocity from the last two detections, or None when the ball is lost
+        if not self.roi_history:
+            return None
+        last_frame, last_center = self.roi_history[-1]
+        if len(self.roi_history) == 1:
+            return last_center
+        previous_frame, previous_center = self.roi_history[-2]
+        velocity = (last_center - previous_center) / (last_frame - previous_frame)
+        return last_center + velocity * (frame_num - last_frame)
+
+    def detect_ball_in_roi(self, frame, frame_num, roi_size):
+        """
+        Run the model on a roi_size crop centred on the predicted ball
+        position and map the boxes back to frame coordinates. Of several
+        boxes, the one closest to the prediction is the ball rather than the
+        first one. With no prediction, or nothing found in the crop, the full
+        frame is searched and the most confident box is kept.
+        """
+        predicted = self.predict_ball_center(frame_num)
+        if predicted is not None:
+            frame_height, frame_width = frame.shape[:2]
+            x0 = int(np.clip(predicted[0] - roi_size / 2, 0, max(frame_width - roi_size, 0)))
+            y0 = int(np.clip(predicted[1] - roi_size / 2, 0, max(frame_height - roi_size, 0)))
+            crop = frame[y0:y0 + roi_size, x0:x0 + roi_size]
+
+            # an imgsz given to the tracker applies to the crop as well
+            roi_params = dict(self.inference_params)
+            roi_params.setdefault('imgsz', get_roi_imgsz(roi_size))
+            with measure(self.metrics, 'ball_model_roi', 1, per_frame=True):
+                results = self.model(crop, **roi_params)[0]
+            bboxes, confidences = self.get_ball_candidates(results)
+            self.roi_calls += 1
+            if len(bboxes) > 0:
+                bboxes = bboxes + np.array([x0, y0, x0, y0], dtype=np.float64)
+                centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+                best = int(np.argmin(np.linalg.norm(centers - predicted, axis=1)))
+                return np.ones(1, np.int64), bboxes[best:best + 1], confidences[best:best + 1]
+
+        with measure(self.metrics, 'ball_model', 1, per_frame=True):
+            results = self.model(frame, **self.inference_params)[0]
+        bboxes, confidences = self.get_ball_candidates(results)
+        self.full_frame_calls += 1
+        if len(bboxes) == 0:
+            return np.empty(0, np.int64), np.empty((0, 4)), np.empty(0, np.float32)
+        best = int(np.argmax(confidences))
+        return np.ones(1, np.int64), bboxes[best:best + 1], confidences[best:best + 1]
+
+    def get_ball_candidates(self, results):
+        # every box in a result as (bboxes, confidences)
+        boxes = results.boxes
+        if len(boxes) == 0:
+            return np.empty((0, 4)), np.empty(0, np.float32)
+        return boxes.xyxy.cpu().numpy().astype(np.float64), boxes.conf.cpu().numpy().astype(np.float32)
+
+    def get_detection_report(self):
+        return {
+            'frames': self.frames_seen,
+            'inference_calls': self.roi_calls + self.full_frame_calls,
+            'calls_saved': self.frames_seen - self.frames_detected,
+            'roi_calls': self.roi_calls,
+            'full_frame_calls': self.full_frame_calls,
+        }
+
+    def merge_detection_report(self, report):
+        # add counts from a worker process that detected part of this video
+        self.frames_seen += report['frames']
+        self.frames_detected += report['frames'] - report['calls_saved']
+        self.roi_calls += report['roi_calls']
+        self.full_frame_calls += report['full_frame_calls']
 
-        if stub_path is not None:
-            with open(stub_path, "wb") as f:
-                pickle.dump(ball_detections, f)
-            print("👉 Saved ball stubs!")
+    # =======================================================
+    #   YOLO BATCH OF FRAMES
+    # =======================================================
+    def detect_batch(self, frames):
 
-        return ball_detections
+        with measure(self.metrics, 'ball_model', len(frames), per_frame=True):
+            results = self.model(list(frames), **self.inference_params)
+        return [self.get_ball_arrays(result) for result in results]
 
     # =======================================================
     #   YOLO SINGLE FRAME
     # =======================================================
     def detect_frame(self, frame):
 
-        results = self.model(frame, conf=0.15)[0]
+        with measure(self.metrics, 'ball_model', 1, per_frame=True):
+            results = self.model(frame, **self.inference_params)[0]
+        return self.get_ball_dict(results)
+
+    def get_ball_arrays(self, results):
+        # (track_ids, bboxes, confidences) with the first detection as ball 1
+        boxes = results.boxes
+        if len(boxes) == 0:
+            return np.empty(0, np.int64), np.empty((0, 4)), np.empty(0, np.float32)
+        return (
+            np.ones(1, np.int64),
+            boxes.xyxy[:1].cpu().numpy().astype(np.float64),
+            boxes.conf[:1].cpu().numpy().astype(np.float32),
+        )
+
+    def get_ball_dict(self, results):
+
         ball_dict = {}
 
         for box in results.boxes:
@@ -149,30 +605,37 @@ class BallTracker:
         out_frames = []
 
         for frame, ball_dict in zip(video_frames, detections):
+            out_frames.append(self.draw_bbox_on_frame(frame, ball_dict))
+
+        return out_frames
 
-            if 1 in ball_dict and ball_dict[1] is not None:
+    def draw_bbox_on_frame(self, frame, ball_dict):
 
-                x1, y1, x2, y2 = ball_dict[1]
+        if 1 in ball_dict and ball_dict[1] is not None:
+            frame = self.draw_ball_on_frame(frame, [1], [ball_dict[1]])
 
-                cv2.putText(
-                    frame,
-                    "Ball",
-                    (int(x1), int(y1) - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.8,
-                    (0, 255, 255),
-                    2
-                )
+        return frame
 
-                cv2.rectangle(
-                    frame,
-                    (int(x1), int(y1)),
-                    (int(x2), int(y2)),
-                    (0, 255, 255),
-                    2
-                )
+    def draw_ball_on_frame(self, frame, track_ids, bboxes):
 
-            out_frames.append(frame)
+        for x1, y1, x2, y2 in np.asarray(bboxes).tolist():
 
-        return out_frames
+            cv2.putText(
+                frame,
+                "Ball",
+                (int(x1), int(y1) - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.8,
+                (0, 255, 255),
+                2
+            )
+
+            cv2.rectangle(
+                frame,
+                (int(x1), int(y1)),
+                (int(x2), int(y2)),
+                (0, 255, 255),
+                2
+            )
 
+        return frame
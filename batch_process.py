@@ -0,0 +1,245 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils import get_video_properties
+from detection_cache import DetectionCache
+from model_pool import Models, pin_threads
+from video_writer import VIDEO_CODECS, get_output_video_path
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def collect_videos(source):
+    """
+    Videos to process: every video file in a directory, or the paths listed
+    in a manifest file (one per line, relative to the manifest, '#' comments).
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name)
+            for name in os.listdir(source)
+            if name.lower().endswith(VIDEO_EXTENSIONS)
+        )
+
+    manifest_dir = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(manifest_dir, line) for line in lines if line and not line.startswith('#')]
+
+
+def get_output_path(video_path, output_dir, codec="mjpg"):
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    return get_output_video_path(os.path.join(output_dir, video_name), codec)
+
+
+# =======================================================
+#   WORKER PROCESS
+# =======================================================
+# loaded once per worker process by init_worker and reused for every video it gets
+_worker_models = None
+_worker_detection_cache = None
+
+def init_worker(num_threads, cache_dir):
+    global _worker_models, _worker_detection_cache
+    pin_threads(num_threads)
+    _worker_models = Models()
+    _worker_detection_cache = DetectionCache(cache_dir) if cache_dir is not None else None
+
+
+def is_video_complete(video_path, output_path, models, detection_cache):
+    # outputs are renamed into place when finished, so an existing file is complete
+    if not os.path.exists(output_path):
+        return False
+    if detection_cache is None:
+        return True
+
+    from main import get_detection_cache_key
+    trackers = {'player': models.player_tracker, 'ball': models.ball_tracker}
+    return all(
+        detection_cache.contains(get_detection_cache_key(detection_cache, name, tracker, video_path))
+        for name, tracker in trackers.items()
+    )
+
+
+def make_record(video_path, output_path, status='done', error=None):
+    return {
+        'video': video_path,
+        'output': output_path,
+        'status': status,
+        'frames': get_video_properties(video_path)['frame_count'],
+        'seconds': 0.0,
+        'fps': None,
+        'error': error,
+    }
+
+
+def process_video(video_path, output_path, main_kwargs):
+    from main import main as run_pipeline
+
+    record = make_record(video_path, output_path)
+
+    if is_video_complete(video_path, output_path, _worker_models, _worker_detection_cache):
+        record['status'] = 'skipped'
+        return record
+
+    # write next to the final output and rename, so a killed run never leaves
+    # an output that looks complete
+    output_name, container = os.path.splitext(output_path)
+    partial_path = f"{output_name}.partial{container}"
+    start = time.perf_counter()
+    try:
+        _worker_models.reset()
+        run_pipeline(
+            video_path,
+            partial_path,
+            use_detection_cache=_worker_detection_cache is not None,
+            detection_cache=_worker_detection_cache,
+            models=_worker_models,
+            **main_kwargs
+        )
+        os.replace(partial_path, output_path)
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = f"{type(e).__name__}: {e}"
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    record['seconds'] = time.perf_counter() - start
+    if record['status'] == 'done' and record['seconds'] > 0:
+        record['fps'] = record['frames'] / record['seconds']
+    return record
+
+
+# =======================================================
+#   BATCH
+# =======================================================
+def get_batch_report(records, num_workers, threads_per_worker, batch_seconds):
+    processed = [record for record in records if record['status'] == 'done']
+    processed_frames = sum(record['frames'] for record in processed)
+    return {
+        'num_workers': num_workers,
+        'threads_per_worker': threads_per_worker,
+        'seconds': batch_seconds,
+        'done': len(processed),
+        'skipped': sum(record['status'] == 'skipped' for record in records),
+        'failed': sum(record['status'] == 'failed' for record in records),
+        'frames_processed': processed_frames,
+        'fps': processed_frames / batch_seconds if batch_seconds > 0 else None,
+        'videos': sorted(records, key=lambda record: record['video']),
+    }
+
+
+def save_batch_report(report, report_path):
+    # replaced in one step, so an interrupted batch still leaves a readable report
+    tmp_path = f"{report_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, report_path)
+
+
+def run_batch(source, output_dir="output_videos", num_workers=1, threads_per_worker=None,
+              cache_dir="detection_cache", report_path=None, **main_kwargs):
+    """
+    Process every video from collect_videos(source) on a pool of num_workers
+    processes, each loading the models once and limited to threads_per_worker
+    torch/OpenCV threads (default: the CPU count divided between workers).
+
+    Videos whose output and cached detections already exist are skipped, so
+    an interrupted batch can simply be run again. A JSON report with
+    per-video throughput is written to report_path (default
+    output_dir/batch_report.json) and returned; it is rewritten after every
+    video, so it covers the videos finished so far if the batch is killed.
+    A video whose worker process dies is recorded as failed.
+    """
+    videos = collect_videos(source)
+    codec = main_kwargs.get('video_codec', "mjpg")
+    output_paths = [get_output_path(video_path, output_dir, codec) for video_path in videos]
+    if len(set(output_paths)) != len(output_paths):
+        raise ValueError("Videos with the same file name would overwrite each other's output")
+
+    os.makedirs(output_dir, exist_ok=True)
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+    if report_path is None:
+        report_path = os.path.join(output_dir, "batch_report.json")
+
+    # throughput of videos skipped now was measured by the run that processed them
+    previous_records = {}
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            previous_records = {record['video']: record for record in json.load(f)['videos']}
+
+    records = []
+    batch_start = time.perf_counter()
+    # spawn, not fork: torch and OpenCV thread pools don't survive a fork
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(threads_per_worker, cache_dir),
+    ) as executor:
+        futures = {
+            executor.submit(process_video, video_path, output_path, main_kwargs): (video_path, output_path)
+            for video_path, output_path in zip(videos, output_paths)
+        }
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                # the worker died (killed for memory, crashed in native code, failed to load the models, ...)
+                record = make_record(*futures[future], status='failed', error=f"{type(e).__name__}: {e}")
+            previous_record = previous_records.get(record['video'])
+            if record['status'] == 'skipped' and previous_record is not None:
+                record['seconds'] = previous_record['seconds']
+                record['fps'] = previous_record['fps']
+            records.append(record)
+            fps = f"{record['fps']:.2f} fps" if record['fps'] else ""
+            print(f"[{len(records)}/{len(videos)}] {record['status']:>7} {record['video']} {fps}")
+            save_batch_report(
+                get_batch_report(records, num_workers, threads_per_worker, time.perf_counter() - batch_start),
+                report_path
+            )
+    batch_seconds = time.perf_counter() - batch_start
+
+    report = get_batch_report(records, num_workers, threads_per_worker, batch_seconds)
+    save_batch_report(report, report_path)
+
+    print(f"{report['done']} done, {report['skipped']} skipped, {report['failed']} failed "
+          f"in {batch_seconds:.1f}s; report written to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a directory or manifest of match videos")
+    parser.add_argument('source', help="directory of videos, or a manifest file with one video path per line")
+    parser.add_argument('--output-dir', default="output_videos")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads-per-worker', type=int, default=None)
+    parser.add_argument('--cache-dir', default="detection_cache")
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--report', default=None)
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--detection-batch-size', type=int, default=1)
+    parser.add_argument('--court-projection', choices=['keypoint', 'homography'], default="keypoint")
+    parser.add_argument('--codec', choices=sorted(VIDEO_CODECS), default="mjpg")
+    parser.add_argument('--court-keypoints', choices=['first_frame', 'track'], default="first_frame")
+
+    args = parser.parse_args()
+
+    run_batch(
+        args.source,
+        output_dir=args.output_dir,
+        num_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        report_path=args.report,
+        stream=args.stream,
+        detection_batch_size=args.detection_batch_size,
+        court_projection=args.court_projection,
+        video_codec=args.codec,
+        court_keypoint_mode=args.court_keypoints,
+    )
@@ -1,3 +1,5 @@
+import numpy as np
+
 def get_center_of_bbox(bbox):
     x1, y1, x2, y2 = bbox
     center_x = int((x1 + x2) / 2)
@@ -29,4 +31,39 @@ def measure_xy_distance(p1,p2):
     return abs(p1[0]-p2[0]), abs(p1[1]-p2[1])
 
 def get_center_of_bbox(bbox):
-    return (int((bbox[0]+bbox[2])/2),int((bbox[1]+bbox[3])/2))
\ No newline at end of file
+    return (int((bbox[0]+bbox[2])/2),int((bbox[1]+bbox[3])/2))
+
+def sliding_window_max(values, frames_before, frames_after):
+    """
+    For every index i, the max of values[i-frames_before : i+frames_after]
+    (clipped to the array), in O(N) using block prefix/suffix maxima.
+    Missing values should be -inf.
+    """
+    values = np.asarray(values, dtype=float)
+    num_values = len(values)
+    window = frames_before + frames_after
+    if num_values == 0 or window <= 0:
+        return values.copy()
+
+    padded_len = -(-(num_values + window - 1) // window) * window
+    padded = np.full(padded_len, -np.inf)
+    padded[frames_before:frames_before + num_values] = values
+
+    blocks = padded.reshape(-1, window)
+    prefix_max = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix_max = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    starts = np.arange(num_values)
+    return np.maximum(suffix_max[starts], prefix_max[starts + window - 1])
+
+def get_bbox_ious(bboxes1, bboxes2):
+    """(N, M) intersection over union of two arrays of [x1, y1, x2, y2] boxes."""
+    bboxes1 = np.asarray(bboxes1, dtype=float).reshape(-1, 1, 4)
+    bboxes2 = np.asarray(bboxes2, dtype=float).reshape(1, -1, 4)
+    width = np.clip(np.minimum(bboxes1[..., 2], bboxes2[..., 2]) - np.maximum(bboxes1[..., 0], bboxes2[..., 0]), 0, None)
+    height = np.clip(np.minimum(bboxes1[..., 3], bboxes2[..., 3]) - np.maximum(bboxes1[..., 1], bboxes2[..., 1]), 0, None)
+    intersection = width * height
+    area1 = (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
+    area2 = (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
+    union = area1 + area2 - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
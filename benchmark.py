@@ -0,0 +1,551 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from utils import read_video, save_video, draw_player_stats, draw_stats_panel, get_stats_panel_text_alphas
+from trackers import PlayerTracker, BallTracker
+from trackers.ball_tracker import get_roi_imgsz
+from mini_court import MiniCourt
+from frame_compositor import FrameCompositor, frame_layer, track_layer
+from video_writer import BackgroundVideoWriter
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# =======================================================
+#   DETECTION THROUGHPUT PER BATCH SIZE
+# =======================================================
+def benchmark_detection_batch_sizes(video_path, batch_sizes=(1, 4, 8, 16), max_frames=128,
+                                    player_model_path='yolov8x', ball_model_path='models/yolo5_last.pt'):
+    frames = read_video(video_path)[:max_frames]
+    results = []
+
+    for batch_size in batch_sizes:
+        # fresh trackers so persisted track ids from a previous run don't carry over
+        player_tracker = PlayerTracker(model_path=player_model_path)
+        ball_tracker = BallTracker(model_path=ball_model_path)
+
+        # warm up so model loading / first-call setup is not counted
+        player_tracker.detect_frames(frames[:batch_size], batch_size=batch_size)
+        ball_tracker.detect_frames(frames[:batch_size], batch_size=batch_size)
+
+        _, player_seconds = time_call(player_tracker.detect_frames, frames, batch_size=batch_size)
+        _, ball_seconds = time_call(ball_tracker.detect_frames, frames, batch_size=batch_size)
+
+        results.append({
+            'batch_size': batch_size,
+            'player_fps': len(frames) / player_seconds,
+            'ball_fps': len(frames) / ball_seconds,
+        })
+
+    print(f"{'batch':>6} {'player fps':>12} {'ball fps':>12}")
+    for row in results:
+        print(f"{row['batch_size']:>6} {row['player_fps']:>12.2f} {row['ball_fps']:>12.2f}")
+    return results
+
+
+# =======================================================
+#   BALL ROI INFERENCE COST PER CALL
+# =======================================================
+def benchmark_roi_inference(video_path, roi_sizes=(128, 256, 320), max_frames=64,
+                            ball_model_path='models/yolo5_last.pt'):
+    """
+    Per-call cost of the ball model on the full frame and on roi_size crops,
+    once at the model's default input size (the crop upscaled to 640) and
+    once at the crop's own size rounded up to a multiple of 32, which is
+    what BallTracker.detect_ball_in_roi passes.
+    """
+    frames = read_video(video_path)[:max_frames]
+    ball_tracker = BallTracker(model_path=ball_model_path)
+    model, params = ball_tracker.model, ball_tracker.inference_params
+
+    def ms_per_call(images, **extra_params):
+        # warm up so model loading / first-call setup at this input size is not counted
+        model(images[0], **params, **extra_params)
+        _, seconds = time_call(lambda: [model(image, **params, **extra_params) for image in images])
+        return seconds / len(images) * 1000
+
+    results = [{'input': 'full frame', 'imgsz': params.get('imgsz', 640), 'ms_per_call': ms_per_call(frames)}]
+    frame_height, frame_width = frames[0].shape[:2]
+    for roi_size in roi_sizes:
+        x0 = max((frame_width - roi_size) // 2, 0)
+        y0 = max((frame_height - roi_size) // 2, 0)
+        crops = [frame[y0:y0 + roi_size, x0:x0 + roi_size] for frame in frames]
+        results.append({'input': f'{roi_size} crop', 'imgsz': 640, 'ms_per_call': ms_per_call(crops, imgsz=640)})
+        roi_imgsz = get_roi_imgsz(roi_size)
+        results.append({'input': f'{roi_size} crop', 'imgsz': roi_imgsz, 'ms_per_call': ms_per_call(crops, imgsz=roi_imgsz)})
+
+    print(f"{'input':>12} {'imgsz':>6} {'ms/call':>9}")
+    for row in results:
+        print(f"{row['input']:>12} {row['imgsz']:>6} {row['ms_per_call']:>9.2f}")
+    return results
+
+
+# =======================================================
+#   SHOT FRAME DETECTION: PANDAS LOOP VS NUMPY
+# =======================================================
+def synthetic_ball_trajectory(num_frames, seed=0):
+    # ball bouncing between the baselines, with a rally every ~70 frames,
+    # jitter on the detections and some frames with no detection
+    rng = np.random.default_rng(seed)
+    frame_nums = np.arange(num_frames)
+    rally_length = 70
+    phase = (frame_nums % rally_length) / rally_length
+    direction = (frame_nums // rally_length) % 2
+    mid_y = np.where(direction == 0, 200 + 500 * phase, 700 - 500 * phase)
+    mid_y = mid_y + rng.normal(0, 2, num_frames)
+    mid_x = 600 + 200 * np.sin(frame_nums / 40)
+    missing = rng.random(num_frames) < 0.05
+
+    ball_positions = []
+    for x, y, is_missing in zip(mid_x, mid_y, missing):
+        ball_positions.append({} if is_missing else {1: [x - 5, y - 5, x + 5, y + 5]})
+    return ball_positions
+
+
+def loop_shot_frames(delta_y_series, threshold=25):
+    # the original per-frame scan, kept here as the reference implementation
+    hit_frames = []
+    for i in range(1, len(delta_y_series) - int(threshold * 1.2)):
+        upward = delta_y_series.iloc[i] < 0 and delta_y_series.iloc[i + 1] > 0
+        downward = delta_y_series.iloc[i] > 0 and delta_y_series.iloc[i + 1] < 0
+        if upward or downward:
+            count = 0
+            for j in range(i + 1, i + int(threshold * 1.2) + 1):
+                if upward and delta_y_series.iloc[j] > 0:
+                    count += 1
+                if downward and delta_y_series.iloc[j] < 0:
+                    count += 1
+            if count > threshold - 1:
+                hit_frames.append(i)
+    return hit_frames
+
+
+def benchmark_shot_frames(num_frames=100_000):
+    ball_tracker = BallTracker.__new__(BallTracker)  # no model needed
+    ball_positions = ball_tracker.interpolate_ball_positions(synthetic_ball_trajectory(num_frames))
+
+    df = pd.DataFrame([frame[1] for frame in ball_positions], columns=['x1', 'y1', 'x2', 'y2'])
+    mid_y_avg = ((df['y1'] + df['y2']) / 2).rolling(window=5, min_periods=1).mean()
+    delta_y = mid_y_avg.diff()
+
+    loop_hits, loop_seconds = time_call(loop_shot_frames, delta_y)
+    numpy_hits, numpy_seconds = time_call(ball_tracker.find_shot_frames, delta_y.to_numpy())
+    assert loop_hits == numpy_hits, "vectorized shot detection disagrees with the loop"
+
+    print(f"{num_frames} frames, {len(numpy_hits)} hits")
+    print(f"loop:  {loop_seconds:.3f}s")
+    print(f"numpy: {numpy_seconds:.4f}s ({loop_seconds / numpy_seconds:.0f}x)")
+    return {'num_frames': num_frames, 'loop_seconds': loop_seconds, 'numpy_seconds': numpy_seconds}
+
+
+# =======================================================
+#   MINI COURT PROJECTION: KEYPOINT VS HOMOGRAPHY
+# =======================================================
+def synthetic_court_scene(num_frames, frame_shape=(720, 1280, 3), seed=0):
+    # a broadcast-like view: court keypoints are the mini court drawing points
+    # seen through a known perspective, so true mini court positions are known
+    rng = np.random.default_rng(seed)
+    frame = np.zeros(frame_shape, np.uint8)
+    mini_court = MiniCourt(frame)
+
+    drawing_points = np.asarray(mini_court.drawing_key_points, dtype=np.float32).reshape(-1, 2)
+    video_corners = np.float32([[420, 150], [860, 150], [250, 650], [1030, 650]])
+    mini_to_video = cv2.getPerspectiveTransform(drawing_points[:4], video_corners)
+    court_keypoints = cv2.perspectiveTransform(drawing_points.reshape(-1, 1, 2), mini_to_video).ravel()
+
+    x_min, y_min = drawing_points.min(axis=0)
+    x_max, y_max = drawing_points.max(axis=0)
+    true_player_points = rng.uniform([x_min, y_min], [x_max, y_max], (num_frames, 2, 2))
+    true_ball_points = rng.uniform([x_min, y_min], [x_max, y_max], (num_frames, 2))
+
+    foot_points = cv2.perspectiveTransform(true_player_points.reshape(-1, 1, 2), mini_to_video).reshape(num_frames, 2, 2)
+    ball_points = cv2.perspectiveTransform(true_ball_points.reshape(-1, 1, 2), mini_to_video).reshape(num_frames, 2)
+
+    player_detections = []
+    ball_detections = []
+    for frame_num in range(num_frames):
+        player_dict = {}
+        for player_index, (x, y) in enumerate(foot_points[frame_num]):
+            height = 80 + 100 * y / frame_shape[0]
+            player_dict[player_index + 1] = [x - height / 4, y - height, x + height / 4, y]
+        player_detections.append(player_dict)
+        x, y = ball_points[frame_num]
+        ball_detections.append({1: [x - 4, y - 4, x + 4, y + 4]})
+
+    return mini_court, court_keypoints, player_detections, ball_detections, true_player_points, true_ball_points
+
+
+def benchmark_projection(num_frames=20_000):
+    mini_court, court_keypoints, player_detections, ball_detections, true_player_points, true_ball_points = \
+        synthetic_court_scene(num_frames)
+
+    results = {'num_frames': num_frames}
+    for mode in ("keypoint", "homography"):
+        (player_points, ball_points), seconds = time_call(
+            mini_court.convert_bounding_boxes_to_mini_court_coordinates,
+            player_detections, ball_detections, court_keypoints, mode=mode
+        )
+        player_points = np.array([[frame[1], frame[2]] for frame in player_points], dtype=float)
+        ball_points = np.array([frame[1] for frame in ball_points], dtype=float)
+        player_error = np.linalg.norm(player_points - true_player_points, axis=-1).mean()
+        ball_error = np.linalg.norm(ball_points - true_ball_points, axis=-1).mean()
+
+        results[mode] = {'seconds': seconds, 'player_error_px': player_error, 'ball_error_px': ball_error}
+        print(f"{mode:>10}: {seconds:.3f}s, mean error players {player_error:.1f}px, ball {ball_error:.1f}px")
+
+    return results
+
+
+# =======================================================
+#   PER-STAGE SUITE: SYNTHETIC VIDEOS, STUB DETECTORS
+# =======================================================
+PLAYER_COLORS = ((255, 0, 0), (0, 0, 255))  # BGR blue, red
+BALL_COLOR = (0, 255, 255)  # BGR yellow
+
+
+class StubTensor:
+    # the bits of a torch tensor the trackers use
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def tolist(self):
+        return self.array.tolist()
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return StubTensor(self.array[index])
+
+
+class StubBoxes:
+    def __init__(self, bboxes, track_ids, class_ids, confidences):
+        self.xyxy = StubTensor(np.asarray(bboxes, dtype=np.float32).reshape(-1, 4))
+        self.id = StubTensor(track_ids) if len(track_ids) else None
+        self.cls = StubTensor(class_ids)
+        self.conf = StubTensor(np.asarray(confidences, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class StubResult:
+    names = {0: 'person', 1: 'tennis ball'}
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubDetector:
+    """
+    Deterministic stand-in for a YOLO model on the synthetic videos: finds
+    the coloured player and ball sprites by thresholding, so detection still
+    does per-pixel work but needs no weights or GPU. Supports model(frames)
+    and model.track(frames).
+    """
+    def __init__(self, kind):
+        self.kind = kind
+
+    def detect(self, frame):
+        bboxes, track_ids, class_ids = [], [], []
+        if self.kind == 'player':
+            for track_id, color in enumerate(PLAYER_COLORS, start=1):
+                channel = int(np.argmax(color))
+                ys, xs = np.nonzero((frame[:, :, channel] > 200) & (frame[:, :, 1] < 60))
+                if len(xs):
+                    bboxes.append([xs.min(), ys.min(), xs.max(), ys.max()])
+                    track_ids.append(track_id)
+                    class_ids.append(0)
+        else:
+            ys, xs = np.nonzero((frame[:, :, 1] > 200) & (frame[:, :, 2] > 200) & (frame[:, :, 0] < 60))
+            if len(xs):
+                bboxes.append([xs.min(), ys.min(), xs.max(), ys.max()])
+                track_ids.append(1)
+                class_ids.append(1)
+        return StubResult(StubBoxes(bboxes, track_ids, class_ids, [0.9] * len(bboxes)))
+
+    def __call__(self, frames, **kwargs):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        return [self.detect(frame) for frame in frames]
+
+    def track(self, frames, persist=False, **kwargs):
+        return self(frames, **kwargs)
+
+
+def make_stub_trackers():
+    player_tracker = PlayerTracker.__new__(PlayerTracker)  # no weights needed
+    player_tracker.model = StubDetector('player')
+    player_tracker.model_path = 'stub'
+    player_tracker.inference_params = {}
+    player_tracker.reset()
+
+    ball_tracker = BallTracker.__new__(BallTracker)
+    ball_tracker.model = StubDetector('ball')
+    ball_tracker.model_path = 'stub'
+    ball_tracker.inference_params = {}
+    ball_tracker.reset()
+    return player_tracker, ball_tracker
+
+
+def make_synthetic_court_video(video_path, num_frames, frame_size=(1280, 720), fps=24, seed=0):
+    """
+    Write a synthetic match video: court lines seen in perspective, two
+    player sprites moving along the baselines and a ball sprite rallying
+    between them. Returns the court keypoints of the video.
+    """
+    width, height = frame_size
+    rng = np.random.default_rng(seed)
+    mini_court = MiniCourt(np.zeros((height, width, 3), np.uint8))
+
+    # mini court drawing points seen through a perspective, scaled to the frame
+    drawing_points = np.asarray(mini_court.drawing_key_points, dtype=np.float32).reshape(-1, 2)
+    video_corners = np.float32([[0.33, 0.21], [0.67, 0.21], [0.2, 0.9], [0.8, 0.9]]) * np.float32([width, height])
+    mini_to_video = cv2.getPerspectiveTransform(drawing_points[:4], video_corners)
+    court_keypoints = cv2.perspectiveTransform(drawing_points.reshape(-1, 1, 2), mini_to_video).reshape(-1, 2)
+
+    background = np.full((height, width, 3), (60, 120, 40), np.uint8)
+    for start, end in ((0, 1), (2, 3), (0, 2), (1, 3), (4, 5), (6, 7), (8, 9), (10, 11), (12, 13)):
+        cv2.line(background, tuple(court_keypoints[start].astype(int)), tuple(court_keypoints[end].astype(int)),
+                 (255, 255, 255), max(1, width // 640))
+
+    frame_nums = np.arange(num_frames)
+    rally_length = 48
+    phase = (frame_nums % rally_length) / rally_length
+    direction = (frame_nums // rally_length) % 2
+    far_y, near_y = video_corners[0, 1], video_corners[2, 1]
+    player_xs = [width * (0.5 + 0.15 * np.sin(frame_nums / (30 + 7 * player_num) + player_num))
+                 for player_num in range(2)]
+    ball_y = np.where(direction == 0, far_y + (near_y - far_y) * phase, near_y - (near_y - far_y) * phase)
+    ball_x = player_xs[0] + (player_xs[1] - player_xs[0]) * np.where(direction == 0, phase, 1 - phase)
+    ball_y = ball_y - height * 0.15 * np.sin(np.pi * phase) + rng.normal(0, 1, num_frames)
+
+    player_height = int(height * 0.15)
+    ball_radius = max(2, width // 320)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, frame_size)
+    for frame_num in range(num_frames):
+        frame = background.copy()
+        for player_num, (color, foot_y) in enumerate(zip(PLAYER_COLORS, (far_y, near_y))):
+            x = int(player_xs[player_num][frame_num])
+            cv2.rectangle(frame, (x - player_height // 4, int(foot_y) - player_height), (x + player_height // 4, int(foot_y)), color, -1)
+        cv2.circle(frame, (int(ball_x[frame_num]), int(ball_y[frame_num])), ball_radius, BALL_COLOR, -1)
+        writer.write(frame)
+    writer.release()
+    return court_keypoints.ravel()
+
+
+def benchmark_stages(video_path, court_keypoints, work_dir):
+    """
+    Seconds spent in each stage of the pipeline on one synthetic video,
+    using the stub detectors. The per-pass draw_* functions and the
+    single-pass compositor are both timed, as are the list-of-dict and
+    TrackStore versions of the analysis steps.
+    """
+    from main import get_player_stats, draw_frame_number
+
+    stages = {}
+    def timed(stage, func, *args, **kwargs):
+        result, stages[stage] = time_call(func, *args, **kwargs)
+        return result
+
+    player_tracker, ball_tracker = make_stub_trackers()
+
+    frames = timed('read_video', read_video, video_path)
+    player_detections = timed('detect_players', player_tracker.detect_frames, frames)
+    ball_detections = timed('detect_ball', ball_tracker.detect_frames, frames)
+
+    timed('interpolate_ball_positions', ball_tracker.interpolate_ball_positions, ball_detections.to_detections())
+    ball_detections = timed('interpolate_ball_track', ball_tracker.interpolate_ball_track, ball_detections)
+
+    timed('get_ball_shot_frames', ball_tracker.get_ball_shot_frames, ball_detections.to_detections())
+    ball_shot_frames = timed('get_ball_shot_frames_from_track', ball_tracker.get_ball_shot_frames_from_track, ball_detections)
+
+    player_detections = timed('choose_and_filter_players', player_tracker.choose_and_filter_players,
+                              court_keypoints, player_detections)
+
+    mini_court = MiniCourt(frames[0])
+    timed('convert_bounding_boxes_to_mini_court_coordinates', mini_court.convert_bounding_boxes_to_mini_court_coordinates,
+          player_detections.to_detections(), ball_detections.to_detections(), court_keypoints)
+    player_mini_court_detections, ball_mini_court_detections = timed(
+        'convert_tracks_to_mini_court_coordinates', mini_court.convert_tracks_to_mini_court_coordinates,
+        player_detections, ball_detections, court_keypoints)
+    ball_mini_court_points, _ = ball_mini_court_detections.get_dense_track(1)
+
+    player_stats = timed('player_stats', lambda: get_player_stats(ball_shot_frames, ball_mini_court_points,
+                                                                  player_mini_court_detections, mini_court).get_frame_stats(len(frames)))
+    text_alphas = timed('stats_text_alphas', get_stats_panel_text_alphas, player_stats, frames[0])
+
+    # one pass over the whole video per annotation, as the pipeline used to draw
+    try:
+        from court_line_detector import CourtLineDetector
+    except ImportError:
+        CourtLineDetector = None
+    drawn_frames = timed('draw_bboxes_players', player_tracker.draw_bboxes, frames, player_detections.to_detections())
+    drawn_frames = timed('draw_bboxes_ball', ball_tracker.draw_bboxes, drawn_frames, ball_detections.to_detections())
+    if CourtLineDetector is not None:
+        drawn_frames = timed('draw_keypoints_on_video', CourtLineDetector.draw_keypoints_on_video,
+                             CourtLineDetector.__new__(CourtLineDetector), drawn_frames, court_keypoints)
+    drawn_frames = timed('draw_mini_court', mini_court.draw_mini_court, drawn_frames)
+    drawn_frames = timed('draw_points_on_mini_court_players', mini_court.draw_points_on_mini_court,
+                         drawn_frames, player_mini_court_detections.to_detections())
+    drawn_frames = timed('draw_points_on_mini_court_ball', mini_court.draw_points_on_mini_court,
+                         drawn_frames, ball_mini_court_detections.to_detections(), (0, 255, 255))
+    drawn_frames = timed('draw_player_stats', draw_player_stats, drawn_frames, pd.DataFrame(player_stats))
+    drawn_frames = timed('draw_frame_number', lambda: [draw_frame_number(frame, frame_num)
+                                                       for frame_num, frame in enumerate(drawn_frames)])
+
+    timed('save_video', save_video, drawn_frames, os.path.join(work_dir, 'save_video.avi'))
+    del drawn_frames, frames
+
+    # the same annotations in one compositor pass, encoded on a background thread
+    frames = read_video(video_path)
+    compositor = FrameCompositor()
+    compositor.add_layer(track_layer(player_detections, player_tracker.draw_tracks_on_frame))
+    compositor.add_layer(track_layer(ball_detections, ball_tracker.draw_ball_on_frame))
+    if CourtLineDetector is not None:
+        court_line_detector = CourtLineDetector.__new__(CourtLineDetector)
+        compositor.add_layer(lambda frame, frame_num: court_line_detector.draw_keypoints(frame, court_keypoints))
+    compositor.add_layer(lambda frame, frame_num: mini_court.draw_mini_court_sprite(frame))
+    compositor.add_layer(track_layer(player_mini_court_detections, mini_court.draw_track_points_on_frame))
+    compositor.add_layer(track_layer(ball_mini_court_detections, mini_court.draw_track_points_on_frame, (0, 255, 255)))
+    compositor.add_layer(frame_layer(text_alphas, draw_stats_panel))
+    compositor.add_layer(draw_frame_number)
+    frames = timed('render_single_pass', compositor.render, frames)
+
+    def write_in_background():
+        video_writer = BackgroundVideoWriter(os.path.join(work_dir, 'background.avi'), (frames[0].shape[1], frames[0].shape[0]))
+        for frame in frames:
+            video_writer.write(frame)
+        video_writer.release()
+    timed('background_writer', write_in_background)
+
+    return stages
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(resolutions=((640, 360), (1280, 720), (1920, 1080)), lengths=(60, 240),
+              output_path="benchmark_results.json", compare_path=None):
+    """
+    benchmark_stages for every resolution and video length, saved as JSON
+    with the commit and library versions. With compare_path (an earlier
+    results file), each stage's time is printed next to the old one.
+    """
+    cases = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for width, height in resolutions:
+            for num_frames in lengths:
+                video_path = os.path.join(work_dir, f"court_{width}x{height}_{num_frames}.avi")
+                court_keypoints = make_synthetic_court_video(video_path, num_frames, (width, height))
+                stages = benchmark_stages(video_path, court_keypoints, work_dir)
+                os.remove(video_path)
+
+                seconds = sum(stages.values())
+                cases.append({
+                    'resolution': [width, height],
+                    'num_frames': num_frames,
+                    'seconds': seconds,
+                    'fps': num_frames / seconds if seconds > 0 else None,
+                    'stages': stages,
+                })
+                print(f"{width}x{height}, {num_frames} frames: {seconds:.2f}s total")
+
+    results = {
+        'commit': get_git_commit(),
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count(),
+        'cases': cases,
+    }
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output_path}")
+
+    if compare_path is not None:
+        compare_results(compare_path, results)
+    return results
+
+
+def compare_results(old_path, new_results):
+    with open(old_path) as f:
+        old_results = json.load(f)
+    old_cases = {(tuple(case['resolution']), case['num_frames']): case['stages'] for case in old_results['cases']}
+
+    print(f"{'case':<18} {'stage':<50} {'old s':>9} {'new s':>9} {'ratio':>7}")
+    for case in new_results['cases']:
+        old_stages = old_cases.get((tuple(case['resolution']), case['num_frames']))
+        if old_stages is None:
+            continue
+        case_name = f"{case['resolution'][0]}x{case['resolution'][1]}/{case['num_frames']}"
+        for stage, seconds in case['stages'].items():
+            if stage in old_stages:
+                old_seconds = old_stages[stage]
+                ratio = seconds / old_seconds if old_seconds > 0 else float('inf')
+                print(f"{case_name:<18} {stage:<50} {old_seconds:>9.4f} {seconds:>9.4f} {ratio:>6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tennis analysis benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    detection_parser = subparsers.add_parser('detection', help="YOLO throughput per batch size")
+    detection_parser.add_argument('video_path')
+    detection_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    detection_parser.add_argument('--max-frames', type=int, default=128)
+
+    roi_parser = subparsers.add_parser('roi', help="ball model cost per call on full frames and ROI crops")
+    roi_parser.add_argument('video_path')
+    roi_parser.add_argument('--roi-sizes', type=int, nargs='+', default=[128, 256, 320])
+    roi_parser.add_argument('--max-frames', type=int, default=64)
+
+    shots_parser = subparsers.add_parser('shots', help="shot frame detection on a synthetic trajectory")
+    shots_parser.add_argument('--num-frames', type=int, default=100_000)
+
+    projection_parser = subparsers.add_parser('projection', help="mini court conversion on synthetic detections")
+    projection_parser.add_argument('--num-frames', type=int, default=20_000)
+
+    suite_parser = subparsers.add_parser('suite', help="per-stage timings on synthetic videos with stub detectors")
+    suite_parser.add_argument('--resolutions', nargs='+', default=['640x360', '1280x720', '1920x1080'])
+    suite_parser.add_argument('--lengths', type=int, nargs='+', default=[60, 240])
+    suite_parser.add_argument('--output', default="benchmark_results.json")
+    suite_parser.add_argument('--compare', default=None, help="earlier results file to compare against")
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'detection':
+        benchmark_detection_batch_sizes(args.video_path, tuple(args.batch_sizes), args.max_frames)
+    elif args.benchmark == 'roi':
+        benchmark_roi_inference(args.video_path, tuple(args.roi_sizes), args.max_frames)
+    elif args.benchmark == 'shots':
+        benchmark_shot_frames(args.num_frames)
+    elif args.benchmark == 'projection':
+        benchmark_projection(args.num_frames)
+    elif args.benchmark == 'suite':
+        resolutions = [tuple(int(size) for size in resolution.split('x')) for resolution in args.resolutions]
+        run_suite(resolutions, tuple(args.lengths), args.output, args.compare)
@@ -0,0 +1,135 @@
+import cv2
+import numpy as np
+
+# camera changes are looked for on small grayscale copies of the frames
+CHANGE_DETECTION_SIZE = (64, 36)
+HISTOGRAM_BINS = 32
+
+
+def get_change_signature(frame):
+    """A downscaled grayscale frame and its normalised histogram, cheap to compare."""
+    small = cv2.resize(frame, CHANGE_DETECTION_SIZE, interpolation=cv2.INTER_AREA)
+    small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    histogram = cv2.calcHist([small], [0], None, [HISTOGRAM_BINS], [0, 256])
+    histogram /= histogram.sum()
+    return small.astype(np.float32), histogram
+
+
+class CourtKeypointTimeline:
+    """
+    Court keypoints per segment of the video: segment i covers frames
+    segment_starts[i] up to the next segment's start (the last one runs to
+    the end of the video), and keypoints[i] holds its 28 keypoint
+    coordinates.
+    """
+    def __init__(self, segment_starts, keypoints):
+        self.segment_starts = np.asarray(segment_starts, dtype=np.int64)
+        self.keypoints = [np.asarray(segment_keypoints) for segment_keypoints in keypoints]
+        if len(self.segment_starts) == 0 or self.segment_starts[0] != 0:
+            raise ValueError("The first segment must start at frame 0")
+
+    @classmethod
+    def constant(cls, keypoints):
+        # one set of keypoints for the whole video
+        return cls([0], [keypoints])
+
+    def __len__(self):
+        return len(self.segment_starts)
+
+    def get_segment_num(self, frame_num):
+        return int(np.searchsorted(self.segment_starts, frame_num, side='right')) - 1
+
+    def get_keypoints(self, frame_num):
+        return self.keypoints[self.get_segment_num(frame_num)]
+
+    def get_segment_ranges(self, num_frames):
+        """(start, end) frame ranges of the segments within a video of num_frames frames."""
+        ends = np.append(self.segment_starts[1:], num_frames)
+        return [
+            (int(start), int(end))
+            for start, end in zip(np.minimum(self.segment_starts, num_frames), np.minimum(ends, num_frames))
+        ]
+
+    def to_list(self, num_frames):
+        return [
+            {'start_frame': start, 'end_frame': end, 'keypoints': keypoints.tolist()}
+            for (start, end), keypoints in zip(self.get_segment_ranges(num_frames), self.keypoints)
+        ]
+
+
+class CourtKeypointTracker:
+    """
+    Follows the court keypoints through camera cuts and pans without running
+    the keypoint model on every frame. Frames are fed in order with update()
+    and compared on downscaled grayscale copies: by their mean absolute
+    difference (0-255) and the Bhattacharyya distance of their histograms.
+
+    A new segment starts on a cut, when a frame differs from the previous one
+    by more than cut_threshold (or histogram_threshold), and after a pan or
+    zoom, when the frame has drifted from the segment's first frame by more
+    than drift_threshold. Drift is only checked once a segment has
+    min_segment_frames frames, so during a long pan the model runs at most
+    that often. With max_segment_frames set, segments are also cut after
+    that many frames.
+
+    The model only runs on the first frame of each segment, batch_size
+    segments per model call. get_timeline() returns the
+    CourtKeypointTimeline.
+    """
+    def __init__(self, court_line_detector, cut_threshold=10.0, drift_threshold=8.0, histogram_threshold=0.25,
+                 min_segment_frames=12, max_segment_frames=None, batch_size=8):
+        self.court_line_detector = court_line_detector
+        self.cut_threshold = cut_threshold
+        self.drift_threshold = drift_threshold
+        self.histogram_threshold = histogram_threshold
+        self.min_segment_frames = min_segment_frames
+        self.max_segment_frames = max_segment_frames
+        self.batch_size = batch_size
+
+        self.num_frames = 0
+        self.previous = None
+        self.reference = None
+        self.segment_starts = []
+        self.keypoints = []
+        # first frames of segments waiting for the next batched model call
+        self.pending_frames = []
+
+    def is_change(self, signature_a, signature_b, diff_threshold):
+        small_a, histogram_a = signature_a
+        small_b, histogram_b = signature_b
+        if np.abs(small_a - small_b).mean() > diff_threshold:
+            return True
+        return cv2.compareHist(histogram_a, histogram_b, cv2.HISTCMP_BHATTACHARYYA) > self.histogram_threshold
+
+    def is_new_segment(self, frame_num, signature):
+        if self.reference is None:
+            return True
+        if self.is_change(self.previous, signature, self.cut_threshold):
+            return True
+        segment_frames = frame_num - self.segment_starts[-1]
+        if segment_frames >= self.min_segment_frames and self.is_change(self.reference, signature, self.drift_threshold):
+            return True
+        return self.max_segment_frames is not None and segment_frames >= self.max_segment_frames
+
+    def update(self, frames):
+        for frame in frames:
+            frame_num = self.num_frames
+            self.num_frames += 1
+            signature = get_change_signature(frame)
+
+            if self.is_new_segment(frame_num, signature):
+                self.segment_starts.append(frame_num)
+                self.reference = signature
+                self.pending_frames.append(frame)
+                if len(self.pending_frames) == self.batch_size:
+                    self.flush()
+            self.previous = signature
+
+    def flush(self):
+        if self.pending_frames:
+            self.keypoints.extend(self.court_line_detector.predict_batch(self.pending_frames))
+            self.pending_frames = []
+
+    def get_timeline(self):
+        self.flush()
+        return CourtKeypointTimeline(self.segment_starts, self.keypoints)
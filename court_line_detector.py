@@ -2,6 +2,7 @@ import torch
 import torchvision.transforms as transforms
 import torchvision.models as models
 import cv2
+from instrumentation import measure
 
 class CourtLineDetector:
     def __init__(self,model_path):
@@ -15,6 +16,8 @@ class CourtLineDetector:
             transforms.ToTensor(),
             transforms.Normalize(mean=[0.485,0.456,0.406],std=[0.229,0.224,0.225])
         ])
+        # PipelineMetrics of the video being processed, set by main; None records nothing
+        self.metrics = None
 
 
     def predict(self,image):
@@ -22,7 +25,7 @@ class CourtLineDetector:
         img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         image_tensor = self.transform(img_rgb).unsqueeze(0) 
 
-        with torch.no_grad():
+        with measure(self.metrics, 'court_model', 1, per_frame=True), torch.no_grad():
             outputs = self.model(image_tensor)
 
         keypoints = outputs.squeeze().cpu().numpy()
@@ -32,6 +35,22 @@ class CourtLineDetector:
         keypoints[1::2]*= original_h/224.0
 
         return keypoints
+
+    def predict_batch(self, images):
+        """predict() for several images in a single forward pass; one keypoint array per image."""
+        image_tensors = torch.stack([
+            self.transform(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in images
+        ])
+
+        with measure(self.metrics, 'court_model', len(images), per_frame=True), torch.no_grad():
+            outputs = self.model(image_tensors)
+
+        all_keypoints = outputs.cpu().numpy().reshape(len(images), -1)
+        for keypoints, image in zip(all_keypoints, images):
+            original_h, original_w = image.shape[:2]
+            keypoints[::2] *= original_w/224.0
+            keypoints[1::2] *= original_h/224.0
+        return list(all_keypoints)
     
     def draw_keypoints(self,image,keypoints):
         for i in range(0,len(keypoints),2):
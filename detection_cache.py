@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from track_store import TrackStore
+
+CACHE_COLUMNS = ('frame_offsets', 'track_ids', 'coords', 'confidences', 'valid')
+# part of every key, so entries written in an older layout are never read back
+CACHE_FORMAT_VERSION = 2
+
+_file_hashes = {}
+
+def hash_file(path, chunk_size=1 << 20):
+    # memoized on (path, size, mtime) so model weights are only read once per process
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+class DetectionCache:
+    """
+    Detections cached on disk, keyed by the content of the input video, the
+    model weights and the inference parameters, so entries can never go stale.
+
+    Each entry is a directory holding the TrackStore columns as .npy files,
+    memory-mapped on load:
+      frame_offsets (N+1,) int64   detections of frame i are rows offsets[i]:offsets[i+1]
+      track_ids     (K,)   int64
+      coords        (K, 4) float64
+      confidences   (K,)   float32
+      valid         (K,)   bool
+    When the cache grows past max_size_bytes the least recently used entries
+    are evicted.
+    """
+    def __init__(self, cache_dir="detection_cache", max_size_bytes=2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, video_path, model_path, **params):
+        # model_path should be the weights file the model was loaded from; a bare
+        # ultralytics model name that never resolved to a file is keyed by name
+        model_id = hash_file(model_path) if os.path.isfile(model_path) else model_path
+        payload = json.dumps({
+            'format': CACHE_FORMAT_VERSION,
+            'video': hash_file(video_path),
+            'model': model_id,
+            'params': params,
+        }, sort_keys=True)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def contains(self, key):
+        return os.path.isdir(self.get_entry_path(key))
+
+    # =======================================================
+    #   READ
+    # =======================================================
+    def load_arrays(self, key):
+        entry_path = self.get_entry_path(key)
+        if not os.path.isdir(entry_path):
+            return None
+
+        try:
+            arrays = {
+                name: np.load(os.path.join(entry_path, f"{name}.npy"), mmap_mode='r')
+                for name in CACHE_COLUMNS
+            }
+        except (OSError, ValueError):
+            # partially written, corrupted or old-format entry
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+
+        # mark as recently used for eviction
+        os.utime(entry_path)
+        return arrays
+
+    def load(self, key):
+        """Cached detections as a TrackStore, or None."""
+        arrays = self.load_arrays(key)
+        if arrays is None:
+            return None
+        return TrackStore(**arrays)
+
+    # =======================================================
+    #   WRITE
+    # =======================================================
+    def save(self, key, track_store):
+        arrays = {
+            'frame_offsets': track_store.frame_offsets,
+            'track_ids': track_store.track_ids,
+            'coords': track_store.coords.astype(np.float64),
+            'confidences': track_store.confidences,
+            'valid': track_store.valid,
+        }
+
+        # write next to the final location and rename, so readers never see a partial entry
+        entry_path = self.get_entry_path(key)
+        tmp_path = f"{entry_path}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        try:
+            os.rename(tmp_path, entry_path)
+        except OSError:
+            # another worker stored the same key first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry_path) or ".tmp-" in name:
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+            entries.append((os.stat(entry_path).st_mtime, size, entry_path))
+            total_size += size
+
+        # least recently used first
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
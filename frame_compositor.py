@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def frame_layer(per_frame_items, draw_function, *args):
+    """
+    Wrap a per-frame draw function, draw_function(frame, item, *args), into a
+    layer that picks the item for the frame being rendered. Frames past the
+    end of per_frame_items are left as they are.
+    """
+    def layer(frame, frame_num):
+        if frame_num < len(per_frame_items):
+            frame = draw_function(frame, per_frame_items[frame_num], *args)
+        return frame
+    return layer
+
+
+def track_layer(track_store, draw_function, *args):
+    """
+    Same as frame_layer for a TrackStore: calls
+    draw_function(frame, track_ids, coords, *args) with the frame's rows.
+    """
+    def layer(frame, frame_num):
+        if frame_num < track_store.num_frames:
+            track_ids, coords = track_store.get_frame(frame_num)
+            frame = draw_function(frame, track_ids, coords, *args)
+        return frame
+    return layer
+
+
+class FrameCompositor:
+    """
+    Draws every annotation layer onto a frame in one pass, instead of one pass
+    over the whole video per annotation. Layers are callables
+    layer(frame, frame_num) -> frame, applied in the order they were added.
+
+    OpenCV drawing releases the GIL, so with num_workers > 1 frames are
+    rendered concurrently on a thread pool.
+    """
+    def __init__(self, num_workers=1):
+        self.layers = []
+        self.num_workers = num_workers
+        self.executor = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+
+    def add_layer(self, layer):
+        self.layers.append(layer)
+
+    def render_frame(self, frame, frame_num):
+        for layer in self.layers:
+            frame = layer(frame, frame_num)
+        return frame
+
+    def render(self, frames, start_frame_num=0):
+        frame_nums = range(start_frame_num, start_frame_num + len(frames))
+        if self.executor is None:
+            return [self.render_frame(frame, frame_num) for frame, frame_num in zip(frames, frame_nums)]
+        return list(self.executor.map(self.render_frame, frames, frame_nums))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
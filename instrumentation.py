@@ -0,0 +1,230 @@
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# upper edges of the per-frame latency histogram buckets in ms; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+PROFILERS = ('cprofile', 'pyinstrument')
+# stages the trackers and the court line detector record inside the pipeline's own stages
+MODEL_STAGES = ('player_model', 'ball_model', 'ball_model_roi', 'court_model')
+# stages main times with metrics.stage(), so the ones a profiler can run in
+# ('encoding' is measured on the writer's thread and added afterwards)
+PROFILE_STAGES = ('decode', 'detection', 'ball_smoothing', 'court_keypoints', 'player_selection', 'shot_detection',
+                  'mini_court', 'player_stats', 'rendering', 'writer_wait') + MODEL_STAGES
+
+
+def get_peak_rss_mb():
+    """Peak resident memory of this process so far in MB, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss / 1e6 if sys.platform == 'darwin' else peak_rss / 1e3
+
+
+def measure(metrics, stage, num_frames=0, per_frame=False):
+    """metrics.stage(...), or a no-op when metrics is None (instrumentation off)."""
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(stage, num_frames, per_frame)
+
+
+def get_latency_histogram(latencies_ms, counts):
+    bucket_counts = np.bincount(
+        np.searchsorted(LATENCY_BUCKETS_MS, latencies_ms),
+        weights=counts,
+        minlength=len(LATENCY_BUCKETS_MS) + 1
+    )
+    return {
+        'buckets_ms': list(LATENCY_BUCKETS_MS),
+        'counts': [int(count) for count in bucket_counts],
+    }
+
+
+class PipelineMetrics:
+    """
+    Timings for one run of the pipeline. Code under measurement wraps each
+    stage in 'with metrics.stage(name, num_frames):'; a stage entered
+    several times (once per chunk, per batch, ...) accumulates. Stages may
+    nest, so the model stages recorded by the trackers and the court line
+    detector are part of the pipeline's 'detection' and 'court_keypoints'
+    stages, not additional time.
+
+    With per_frame=True each block also adds num_frames samples of its mean
+    per-frame latency to the stage's latency histogram.
+
+    profile_stage names one stage to run under a profiler: 'cprofile'
+    (deterministic, only the calling thread) or 'pyinstrument' (sampling,
+    needs the optional pyinstrument package). Results go to profile_output
+    if given, and the report lists the slowest functions for cProfile. A
+    stage that never ran (e.g. court_model when the keypoints come from the
+    cache) leaves an empty profile.
+    """
+    def __init__(self, profile_stage=None, profiler='cprofile', profile_output=None, profile_top=20):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}")
+        if profile_stage is not None and profile_stage not in PROFILE_STAGES:
+            raise ValueError(f"Unknown stage {profile_stage!r} to profile, expected one of {PROFILE_STAGES}")
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.total_frames = 0
+        self.stages = {}
+        self.latencies = {}
+        # stages can be timed from several threads (e.g. the video writer's)
+        self.lock = threading.Lock()
+
+        self.profile_stage = profile_stage
+        self.profiler_name = profiler
+        self.profile_output = profile_output
+        self.profile_top = profile_top
+        self.profiler = None
+        self.profiler_started = False
+        if profile_stage is not None:
+            self.profiler = self.create_profiler()
+
+    def create_profiler(self):
+        if self.profiler_name == 'cprofile':
+            return cProfile.Profile()
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise RuntimeError("The pyinstrument profiler needs the pyinstrument package") from None
+        return Profiler()
+
+    @contextmanager
+    def stage(self, name, num_frames=0, per_frame=False):
+        profiling = self.profiler is not None and name == self.profile_stage
+        if profiling:
+            self.start_profiler()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiling:
+                self.stop_profiler()
+            self.add_stage_time(name, seconds, num_frames)
+            if per_frame and num_frames > 0:
+                self.record_latency(name, seconds / num_frames, num_frames)
+
+    def iterate(self, name, chunks):
+        """Yield from an iterable of frame chunks, timing the production of each chunk as stage 'name'."""
+        iterator = iter(chunks)
+        while True:
+            with self.stage(name):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            # the chunk's frames, now that its length is known
+            self.add_stage_time(name, 0.0, len(chunk), calls=0)
+            yield chunk
+
+    def start_profiler(self):
+        self.profiler_started = True
+        if self.profiler_name == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop_profiler(self):
+        if self.profiler_name == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    def add_stage_time(self, name, seconds, num_frames=0, calls=1):
+        # for stages measured elsewhere, e.g. the video writer's encoding time
+        with self.lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'frames': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += calls
+            stage['frames'] += num_frames
+
+    def record_latency(self, name, seconds, num_frames=1):
+        # one sample per frame, stored as (latency, count) pairs for whole batches
+        with self.lock:
+            self.latencies.setdefault(name, []).append((seconds, num_frames))
+
+    def finish(self, total_frames):
+        self.total_frames = total_frames
+        self.finished_at = time.perf_counter()
+
+    def get_latency_report(self, name):
+        samples = np.asarray(self.latencies[name], dtype=np.float64)
+        latencies_ms = samples[:, 0] * 1000
+        counts = samples[:, 1].astype(np.int64)
+        all_latencies_ms = np.repeat(latencies_ms, counts)
+        report = {
+            'frames': int(counts.sum()),
+            'mean': float(all_latencies_ms.mean()),
+            'max': float(all_latencies_ms.max()),
+        }
+        for percentile in (50, 90, 99):
+            report[f'p{percentile}'] = float(np.percentile(all_latencies_ms, percentile))
+        report['histogram'] = get_latency_histogram(latencies_ms, counts)
+        return report
+
+    def get_profile_report(self):
+        if self.profiler is None:
+            return None
+        report = {'stage': self.profile_stage, 'profiler': self.profiler_name, 'output_path': self.profile_output}
+
+        if not self.profiler_started:
+            # nothing recorded, and neither profiler can report on an empty session
+            report['output_path'] = None
+            if self.profiler_name == 'cprofile':
+                report['top_functions'] = []
+            return report
+
+        if self.profiler_name == 'pyinstrument':
+            if self.profile_output is not None:
+                with open(self.profile_output, "w") as f:
+                    f.write(self.profiler.output_html() if self.profile_output.endswith('.html')
+                            else self.profiler.output_text())
+            return report
+
+        if self.profile_output is not None:
+            # readable with pstats, snakeviz, ...
+            self.profiler.dump_stats(self.profile_output)
+        stats = pstats.Stats(self.profiler).stats
+        report['top_functions'] = [
+            {
+                'function': f"{filename}:{line_num}({function_name})",
+                'calls': calls,
+                'total_seconds': total_seconds,
+                'cumulative_seconds': cumulative_seconds,
+            }
+            for (filename, line_num, function_name), (_, calls, total_seconds, cumulative_seconds, _)
+            in sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:self.profile_top]
+        ]
+        return report
+
+    def get_report(self):
+        """Everything measured, as plain JSON-serialisable values; times in seconds, latencies in ms."""
+        finished_at = self.finished_at if self.finished_at is not None else time.perf_counter()
+        wall_seconds = finished_at - self.started_at
+        with self.lock:
+            stages = {
+                name: dict(stage, fps=stage['frames'] / stage['seconds'] if stage['frames'] and stage['seconds'] > 0 else None)
+                for name, stage in self.stages.items()
+            }
+            latency_ms = {name: self.get_latency_report(name) for name in self.latencies}
+        return {
+            'wall_seconds': wall_seconds,
+            'frames': self.total_frames,
+            'fps': self.total_frames / wall_seconds if wall_seconds > 0 else None,
+            'peak_rss_mb': get_peak_rss_mb(),
+            'stages': stages,
+            'latency_ms': latency_ms,
+            'profile': self.get_profile_report(),
+        }
@@ -0,0 +1,242 @@
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+# stages that walk over the frames, in pipeline order; progress and ETA are
+# measured over all of them together
+FRAME_STAGES = ("detection", "rendering")
+# within a stage, progress is written to jobs_dir at most this often
+PROGRESS_SAVE_INTERVAL_SECONDS = 1.0
+FINISHED_STATUSES = ("done", "failed")
+
+
+class Job:
+    def __init__(self, job_id, input_path, output_path, kwargs=None):
+        self.job_id = job_id
+        self.input_path = input_path
+        self.output_path = output_path
+        self.kwargs = kwargs or {}
+
+        self.status = "queued"
+        self.stage = None
+        self.frames_processed = 0
+        self.total_frames = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        # once the result is saved to jobs_dir it is dropped from memory, except for these entries
+        self.result_saved = False
+        self.result_summary = None
+
+    def update_progress(self, stage, frames_processed=0, total_frames=None):
+        self.stage = stage
+        self.frames_processed = frames_processed
+        if total_frames is not None:
+            self.total_frames = total_frames
+
+    def get_progress(self):
+        """Fraction of the frame stages done, or None when unknown."""
+        if self.status == "done":
+            return 1.0
+        if self.stage not in FRAME_STAGES or not self.total_frames:
+            return None
+        stage_index = FRAME_STAGES.index(self.stage)
+        stage_fraction = min(self.frames_processed / self.total_frames, 1.0)
+        return (stage_index + stage_fraction) / len(FRAME_STAGES)
+
+    def get_eta_seconds(self):
+        progress = self.get_progress()
+        if self.status != "running" or not progress:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * (1 - progress) / progress
+
+    @classmethod
+    def from_dict(cls, job_dict):
+        """A finished job read back from its file in jobs_dir; the result stays in the file."""
+        job = cls(job_dict["job_id"], None, None)
+        for key in ("status", "stage", "frames_processed", "total_frames", "created_at", "started_at",
+                    "finished_at", "error"):
+            setattr(job, key, job_dict[key])
+        job.result_saved = job_dict.get("result") is not None
+        return job
+
+    def to_dict(self, include_result=False):
+        job_dict = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "frames_processed": self.frames_processed,
+            "total_frames": self.total_frames,
+            "progress": self.get_progress(),
+            "eta_seconds": self.get_eta_seconds(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if include_result:
+            job_dict["result"] = self.result
+        return job_dict
+
+
+class JobQueue:
+    """
+    In-process job queue: submit() returns immediately and num_workers
+    background threads run process_function(input_path, output_path,
+    progress_callback=..., **kwargs) for each job, so at most num_workers
+    videos are analysed at once.
+
+    With jobs_dir set, every job's state is also written there as JSON so it
+    can be inspected from outside the process. A finished job's result is
+    then only kept in that file, read back by get_result(), and in memory
+    just the keep_result_keys entries of it remain as job.result_summary.
+
+    Only the last max_finished_jobs finished jobs are kept in memory (None
+    keeps them all); get() reads older ones back from their files in
+    jobs_dir.
+    """
+    def __init__(self, process_function, num_workers=1, jobs_dir=None, max_finished_jobs=100, keep_result_keys=()):
+        self.process_function = process_function
+        self.jobs_dir = jobs_dir
+        self.max_finished_jobs = max_finished_jobs
+        self.keep_result_keys = tuple(keep_result_keys)
+        self.jobs = {}
+        # ids of finished jobs, oldest first
+        self.finished_job_ids = collections.deque()
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+
+        if self.jobs_dir is not None:
+            os.makedirs(self.jobs_dir, exist_ok=True)
+
+        self.workers = []
+        for worker_num in range(num_workers):
+            worker = threading.Thread(target=self.run_worker, name=f"job-worker-{worker_num}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, input_path, output_path, **kwargs):
+        job = Job(uuid.uuid4().hex, input_path, output_path, kwargs)
+        with self.lock:
+            self.jobs[job.job_id] = job
+        self.save_job(job)
+        self.pending.put(job.job_id)
+        return job
+
+    def get(self, job_id):
+        """The job, read back from jobs_dir if it finished long enough ago to be forgotten; None if unknown."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None or self.jobs_dir is None:
+            return job
+        return self.load_job(job_id)
+
+    def load_job(self, job_id):
+        # ids come from request URLs; only ones submit() could have made name a file
+        try:
+            if uuid.UUID(hex=job_id).hex != job_id:
+                return None
+        except ValueError:
+            return None
+        try:
+            with open(self.get_job_path(job_id)) as f:
+                job_dict = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # a job left queued or running in the file was cut off by a restart, not finished
+        if job_dict.get("status") not in FINISHED_STATUSES:
+            return None
+        return Job.from_dict(job_dict)
+
+    def get_result(self, job):
+        """The job's result, read back from jobs_dir once it is no longer held in memory."""
+        result = job.result
+        if result is not None or not job.result_saved:
+            return result
+        with open(self.get_job_path(job.job_id)) as f:
+            return json.load(f)["result"]
+
+    def get_job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def save_job(self, job):
+        """Write the job's state to jobs_dir; returns whether it was written."""
+        if self.jobs_dir is None:
+            return False
+        job_path = self.get_job_path(job.job_id)
+        tmp_path = f"{job_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(job.to_dict(include_result=True), f)
+            os.replace(tmp_path, job_path)
+        except Exception as e:
+            # the files are only for inspection; failing to write one must not take a worker down
+            print(f"⚠️ Could not save job {job.job_id}: {type(e).__name__}: {e}")
+            return False
+        return True
+
+    def run_worker(self):
+        while True:
+            job = self.get(self.pending.get())
+            try:
+                self.run_job(job)
+            finally:
+                # always, so wait() returns even if a job could not be run
+                self.pending.task_done()
+
+    def run_job(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        self.save_job(job)
+
+        saved_stage, saved_at = None, 0.0
+
+        def progress_callback(stage, frames_processed=0, total_frames=None):
+            nonlocal saved_stage, saved_at
+            job.update_progress(stage, frames_processed, total_frames)
+            # called per chunk; rewriting the file every time would cost more than the progress is worth
+            now = time.monotonic()
+            if stage != saved_stage or now - saved_at >= PROGRESS_SAVE_INTERVAL_SECONDS:
+                self.save_job(job)
+                saved_stage, saved_at = stage, now
+
+        try:
+            job.result = self.process_function(
+                job.input_path,
+                job.output_path,
+                progress_callback=progress_callback,
+                **job.kwargs
+            )
+            status = "done"
+        except Exception as e:
+            status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+
+        job.finished_at = time.time()
+        if job.result is not None:
+            job.result_summary = {key: job.result[key] for key in self.keep_result_keys if key in job.result}
+        # last, so other threads never see a finished job without its finish time and summary
+        job.status = status
+        if self.save_job(job) and job.result is not None:
+            job.result_saved = True
+            job.result = None
+        self.retire_job(job)
+
+    def retire_job(self, job):
+        with self.lock:
+            self.finished_job_ids.append(job.job_id)
+            if self.max_finished_jobs is None:
+                return
+            while len(self.finished_job_ids) > self.max_finished_jobs:
+                self.jobs.pop(self.finished_job_ids.popleft(), None)
+
+    def wait(self):
+        """Block until every submitted job has finished (for local testing)."""
+        self.pending.join()
@@ -0,0 +1,358 @@
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils import (get_stats_panel_position,
+                   get_stats_panel_texts,
+                   render_stats_text_alpha,
+                   draw_stats_panel,
+                   STATS_PANEL_HEIGHT)
+from mini_court import MiniCourt
+from player_stats import PlayerStatsEngine
+from model_pool import Models
+from video_writer import BackgroundVideoWriter
+from main import draw_frame_number
+
+
+# frames of mini court positions kept while waiting for the next shot
+MAX_HISTORY_FRAMES = 2000
+
+
+class LatestFrameGrabber:
+    """
+    Reads a cv2.VideoCapture source on a background thread and keeps only
+    the newest frame. A frame that is replaced before it was taken is
+    dropped, so a slow consumer falls behind by at most one frame instead of
+    queueing without limit. With realtime=True a file is read at its own
+    frame rate, like a camera would deliver it.
+    """
+    def __init__(self, source, realtime=False):
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Cannot open video source {source!r}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 24
+        self.realtime = realtime
+
+        self.condition = threading.Condition()
+        self.latest = None
+        self.finished = False
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+        self.thread = threading.Thread(target=self.run, name="frame-grabber", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            while True:
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+                if self.realtime:
+                    delay = start + self.frames_captured / self.fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self.condition:
+                    if self.latest is not None:
+                        self.frames_dropped += 1
+                    # (source frame number, frame, capture time)
+                    self.latest = (self.frames_captured, frame, time.perf_counter())
+                    self.frames_captured += 1
+                    self.condition.notify()
+        finally:
+            self.capture.release()
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    def get_latest(self):
+        """Wait for the next unseen frame; None once the source has ended."""
+        with self.condition:
+            while self.latest is None and not self.finished:
+                self.condition.wait()
+            latest, self.latest = self.latest, None
+            return latest
+
+
+class OnlineShotDetector:
+    """
+    Shot detection on the filtered ball velocity, one frame at a time: a
+    shot is the frame where the vertical direction flips, reported once the
+    new direction has held for hold_frames frames. That is the detection
+    latency, against the offline detector's look-ahead of 30 frames.
+    """
+    def __init__(self, hold_frames=10):
+        self.hold_frames = hold_frames
+        self.direction = 0
+        self.candidate_frame = None
+        self.candidate_direction = 0
+        self.held = 0
+
+    def update(self, frame_num, velocity_y):
+        """Returns the frame number of a newly confirmed shot, or None."""
+        direction = int(np.sign(velocity_y)) if velocity_y is not None else 0
+        if direction == 0:
+            return None
+        if self.direction == 0:
+            self.direction = direction
+            return None
+
+        if direction != self.direction:
+            if self.candidate_frame is None or direction != self.candidate_direction:
+                self.candidate_frame = frame_num
+                self.candidate_direction = direction
+                self.held = 0
+            self.held += 1
+            if self.held >= self.hold_frames:
+                shot_frame = self.candidate_frame
+                self.direction = direction
+                self.candidate_frame = None
+                return shot_frame
+        else:
+            self.candidate_frame = None
+        return None
+
+
+class LiveAnalyzer:
+    """
+    Per-frame version of the main pipeline for continuous sources: every
+    frame taken from the source is detected, mapped to the mini court, fed
+    to the running stats and rendered before the next one is taken.
+
+    Frames that arrive while one is being processed are dropped (only the
+    newest is kept), and when a frame's end-to-end latency exceeds
+    latency_budget seconds the next frame reuses the last player boxes
+    instead of running the player model. The ball is always detected and
+    smoothed with the tracker's online Kalman filter, which also covers the
+    dropped frames. Court keypoints come from the first frame.
+    """
+    def __init__(self, models=None, latency_budget=0.1, shot_hold_frames=10):
+        self.models = models if models is not None else Models()
+        self.latency_budget = latency_budget
+        self.shot_hold_frames = shot_hold_frames
+        # per-run state, made by setup() from the first frame of a run
+        self.stats_engine = None
+
+    def setup(self, first_frame, fps):
+        self.models.reset()
+        self.fps = fps
+        self.court_keypoints = self.models.court_line_detector.predict(first_frame)
+        self.mini_court = MiniCourt(first_frame)
+        self.homography = self.mini_court.get_court_homography(self.court_keypoints)
+        self.shot_detector = OnlineShotDetector(self.shot_hold_frames)
+
+        self.chosen_players = None
+        self.last_player_ids = np.empty(0, np.int64)
+        self.last_player_bboxes = np.empty((0, 4))
+        # mini court positions on recent frames, for the stats at the next shot
+        self.mini_court_history = {}
+        self.last_shot_frame = None
+        self.stats_engine = PlayerStatsEngine(self.mini_court.get_width_of_mini_court(), fps=fps)
+        self.set_stats_text_alpha(first_frame)
+
+    def set_stats_text_alpha(self, frame):
+        stats = self.stats_engine.get_stats()
+        def average(total, count):
+            return stats[total] / stats[count] if stats[count] else 0.0
+        panel_texts = get_stats_panel_texts(
+            stats['player_1_last_shot_speed'], stats['player_2_last_shot_speed'],
+            stats['player_1_last_player_speed'], stats['player_2_last_player_speed'],
+            average('player_1_total_shot_speed', 'player_1_number_of_shots'),
+            average('player_2_total_shot_speed', 'player_2_number_of_shots'),
+            # same pairing as main: a player's speed is measured on the opponent's shots
+            average('player_1_total_player_speed', 'player_2_number_of_shots'),
+            average('player_2_total_player_speed', 'player_1_number_of_shots'),
+        )
+        start_x, _, _, _ = get_stats_panel_position(frame)
+        self.stats_text_alpha = render_stats_text_alpha(panel_texts, frame.shape[1] - start_x, STATS_PANEL_HEIGHT + 1)
+
+    def detect_players(self, frame, skip):
+        player_tracker = self.models.player_tracker
+        if not skip:
+            track_ids, bboxes = player_tracker.detect_frames([frame]).get_frame(0)
+            if self.chosen_players is None and len(track_ids) >= 2:
+                self.chosen_players = player_tracker.choose_players(
+                    self.court_keypoints, dict(zip(track_ids.tolist(), bboxes.tolist())))
+            if self.chosen_players is not None:
+                keep = np.isin(track_ids, self.chosen_players)
+                track_ids, bboxes = track_ids[keep], bboxes[keep]
+            self.last_player_ids, self.last_player_bboxes = track_ids, bboxes
+        return self.last_player_ids, self.last_player_bboxes
+
+    def update_stats(self, shot_frame, frame):
+        # same measurements as the offline stats, between consecutive shots
+        if self.last_shot_frame is not None:
+            start_frame, end_frame = self.last_shot_frame, shot_frame
+            start, end = self.mini_court_history.get(start_frame), self.mini_court_history.get(end_frame)
+            if start is not None and end is not None and start['ball'] is not None and end['ball'] is not None \
+                    and len(start['players']) == 2 and set(end['players']) == set(start['players']):
+                # players are numbered 1 and 2 in track id order
+                player_nums = {track_id: num for num, track_id in enumerate(sorted(start['players']), start=1)}
+                self.stats_engine.add_shot(
+                    start_frame,
+                    end_frame,
+                    start['ball'],
+                    end['ball'],
+                    {player_nums[track_id]: point for track_id, point in start['players'].items()},
+                    {player_nums[track_id]: point for track_id, point in end['players'].items()}
+                )
+                self.set_stats_text_alpha(frame)
+
+        self.last_shot_frame = shot_frame
+        # nothing before the last shot is needed again
+        self.mini_court_history = {
+            frame_num: positions for frame_num, positions in self.mini_court_history.items()
+            if frame_num >= shot_frame
+        }
+
+    def process_frame(self, frame_num, frame, skip_player_detection=False):
+        player_tracker = self.models.player_tracker
+        ball_tracker = self.models.ball_tracker
+
+        player_ids, player_bboxes = self.detect_players(frame, skip_player_detection)
+
+        _, ball_bboxes = ball_tracker.detect_frames([frame]).get_frame(0)
+        ball = ball_tracker.update_ball_filter(ball_bboxes[0].tolist() if len(ball_bboxes) else None)
+
+        # mini court: player feet and ball centre through the court homography
+        foot_points = np.stack([(player_bboxes[:, 0] + player_bboxes[:, 2]) / 2, player_bboxes[:, 3]], axis=1)
+        points = foot_points if ball['position'] is None else np.vstack([foot_points, [ball['position']]])
+        mini_court_points = self.mini_court.project_points_to_mini_court(points, self.homography)
+        player_points = mini_court_points[:len(foot_points)]
+        ball_point = mini_court_points[len(foot_points)] if ball['position'] is not None else None
+        self.mini_court_history[frame_num] = {
+            'players': dict(zip(player_ids.tolist(), player_points.tolist())),
+            'ball': None if ball_point is None else ball_point.tolist(),
+        }
+        # bounded even when no shot comes for a long time
+        self.mini_court_history.pop(frame_num - MAX_HISTORY_FRAMES, None)
+
+        shot_frame = self.shot_detector.update(frame_num, None if ball['velocity'] is None else ball['velocity'][1])
+        if shot_frame is not None:
+            self.update_stats(shot_frame, frame)
+
+        # render the same layers as the offline output
+        frame = player_tracker.draw_tracks_on_frame(frame, player_ids, player_bboxes)
+        if ball['bbox'] is not None:
+            frame = ball_tracker.draw_ball_on_frame(frame, [1], [ball['bbox']])
+        frame = self.models.court_line_detector.draw_keypoints(frame, self.court_keypoints)
+        frame = self.mini_court.draw_mini_court_sprite(frame)
+        frame = self.mini_court.draw_track_points_on_frame(frame, player_ids, player_points)
+        if ball_point is not None:
+            frame = self.mini_court.draw_track_points_on_frame(frame, [1], [ball_point], (0, 255, 255))
+        frame = draw_stats_panel(frame, self.stats_text_alpha)
+        frame = draw_frame_number(frame, frame_num)
+        return frame, shot_frame
+
+    def run(self, source, realtime=False, output_video_path=None, on_frame=None, max_frames=None):
+        """
+        Analyse 'source' (anything cv2.VideoCapture opens) until it ends or
+        max_frames frames were processed. Rendered frames go to
+        on_frame(frame, frame_num) and/or an output video. Returns a report
+        with frame counts and end-to-end latency percentiles in ms, measured
+        from the moment a frame was read to the moment it was rendered.
+        """
+        grabber = LatestFrameGrabber(source, realtime=realtime)
+        video_writer = None
+        latencies = []
+        shot_frames = []
+        skipped_player_detections = 0
+        last_frame_num = None
+        # a source that yields no frames leaves no stats, not the previous run's
+        self.stats_engine = None
+        start = time.perf_counter()
+
+        try:
+            while max_frames is None or len(latencies) < max_frames:
+                latest = grabber.get_latest()
+                if latest is None:
+                    break
+                frame_num, frame, captured_at = latest
+
+                if last_frame_num is None:
+                    self.setup(frame, grabber.fps)
+                    if output_video_path is not None:
+                        video_writer = BackgroundVideoWriter(output_video_path, (frame.shape[1], frame.shape[0]), fps=grabber.fps)
+                else:
+                    # let the ball filter coast through the frames that were dropped
+                    for _ in range(frame_num - last_frame_num - 1):
+                        self.models.ball_tracker.update_ball_filter(None)
+                last_frame_num = frame_num
+
+                over_budget = bool(latencies) and latencies[-1] > self.latency_budget
+                skipped_player_detections += over_budget and len(self.last_player_ids) > 0
+                frame, shot_frame = self.process_frame(
+                    frame_num, frame,
+                    skip_player_detection=over_budget and len(self.last_player_ids) > 0
+                )
+                if shot_frame is not None:
+                    shot_frames.append(shot_frame)
+
+                if on_frame is not None:
+                    on_frame(frame, frame_num)
+                if video_writer is not None:
+                    video_writer.write(frame)
+                latencies.append(time.perf_counter() - captured_at)
+        finally:
+            if video_writer is not None:
+                video_writer.release()
+
+        seconds = time.perf_counter() - start
+        latencies_ms = np.array(latencies) * 1000
+        report = {
+            'frames_captured': grabber.frames_captured,
+            'frames_processed': len(latencies),
+            'frames_dropped': grabber.frames_dropped,
+            'skipped_player_detections': int(skipped_player_detections),
+            'processing_fps': len(latencies) / seconds if seconds > 0 else None,
+            'shot_frames': shot_frames,
+            'shots': self.stats_engine.shots if self.stats_engine is not None else [],
+            'latency_ms': {
+                f'p{percentile}': float(np.percentile(latencies_ms, percentile)) if len(latencies_ms) else None
+                for percentile in (50, 90, 95, 99)
+            },
+        }
+        report['latency_ms']['max'] = float(latencies_ms.max()) if len(latencies_ms) else None
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live analysis of a camera or stream")
+    parser.add_argument('source', help="camera index, stream URL or video file")
+    parser.add_argument('--realtime', action='store_true', help="read a file at its own frame rate")
+    parser.add_argument('--latency-budget-ms', type=float, default=100)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--show', action='store_true')
+    parser.add_argument('--max-frames', type=int, default=None)
+
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+
+    def show_frame(frame, frame_num):
+        cv2.imshow("Tennis analysis", frame)
+        cv2.waitKey(1)
+
+    analyzer = LiveAnalyzer(latency_budget=args.latency_budget_ms / 1000)
+    report = analyzer.run(
+        source,
+        realtime=args.realtime,
+        output_video_path=args.output,
+        on_frame=show_frame if args.show else None,
+        max_frames=args.max_frames,
+    )
+
+    def format_value(value):
+        # None when no frame was processed
+        return "n/a" if value is None else f"{value:.1f}"
+
+    latency = report['latency_ms']
+    print(f"Processed {report['frames_processed']} of {report['frames_captured']} frames "
+          f"({report['frames_dropped']} dropped, {report['skipped_player_detections']} player detections skipped) "
+          f"at {format_value(report['processing_fps'])} fps")
+    print(f"Latency ms: p50 {format_value(latency['p50'])}  p90 {format_value(latency['p90'])}  "
+          f"p99 {format_value(latency['p99'])}  max {format_value(latency['max'])}")
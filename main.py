@@ -1,184 +1,365 @@
 from utils import (read_video, 
-                   save_video,
-                   measure_distance,
-                   draw_player_stats,
-                   convert_pixel_distance_to_meters
+                   read_video_chunks,
+                   get_video_properties,
+                   encode_jpeg,
+                   get_stats_panel_text_alphas,
+                   draw_stats_panel
                    )
-import constants
-from trackers import PlayerTracker,BallTracker
-from court_line_detector import CourtLineDetector
 from mini_court import MiniCourt
+from frame_compositor import FrameCompositor, frame_layer, track_layer
+from detection_cache import DetectionCache
+from track_store import TrackStore
+from sharded_detection import detect_sharded
+from video_writer import BackgroundVideoWriter, get_output_video_path
+from model_pool import Models
+from instrumentation import PipelineMetrics, MODEL_STAGES
+from player_stats import PlayerStatsEngine
+from court_keypoint_tracker import CourtKeypointTracker, CourtKeypointTimeline
 import cv2
-import pandas as pd
-from copy import deepcopy
+import numpy as np
+
+KEYFRAME_THUMBNAIL_WIDTH = 320
+
+
+def main(input_video_path="input_videos/input_video.mp4",
+         output_video_path="output_videos/output_video.avi",
+         stream=False,
+         chunk_size=64,
+         use_detection_cache=True,
+         detection_cache=None,
+         detection_batch_size=1,
+         detection_shards=1,
+         shard_overlap=32,
+         ball_detection_stride=1,
+         ball_roi_size=None,
+         ball_interpolation_max_gap=None,
+         ball_smoothing="interpolate",
+         court_projection="keypoint",
+         court_keypoint_mode="first_frame",
+         court_max_segment_frames=None,
+         render_workers=1,
+         video_codec="mjpg",
+         progress_callback=None,
+         models=None,
+         metrics=None,
+         num_keyframe_thumbnails=0):
+    # progress_callback(stage, frames_processed, total_frames) is called as
+    # the pipeline moves through "detection", "analysis" and "rendering"
+    if progress_callback is None:
+        progress_callback = lambda stage, frames_processed=0, total_frames=None: None
+    # stage timings, model latencies and memory; pass a PipelineMetrics(profile_stage=...) to profile a stage
+    # court_keypoint_mode="track" re-detects the court keypoints after camera
+    # cuts and pans (see CourtKeypointTracker) instead of using the first frame's;
+    # it looks at every frame, which costs one more decoding pass when streaming
+    # the last rendered frame is returned as a JPEG preview, along with
+    # thumbnails of up to num_keyframe_thumbnails shot frames
+    if metrics is None:
+        metrics = PipelineMetrics()
 
-
-def main():
     # Read Video
-    input_video_path = "input_videos/input_video.mp4"
-    video_frames = read_video(input_video_path)
+    if stream:
+        # decode lazily: every pass over the video only holds one chunk of frames
+        get_frame_chunks = lambda: metrics.iterate("decode", read_video_chunks(input_video_path, chunk_size))
+        total_frames = get_video_properties(input_video_path)['frame_count']
+    else:
+        with metrics.stage("decode"):
+            video_frames = read_video(input_video_path)
+        metrics.add_stage_time("decode", 0.0, len(video_frames), calls=0)
+        get_frame_chunks = lambda: [video_frames]
+        total_frames = len(video_frames)
+    first_frame = next(iter(get_frame_chunks()))[0]
+    # the source's frame rate, for the output video and for speeds in the stats
+    fps = get_video_properties(input_video_path)['fps'] or 24
+
+    # models come loaded (and reset) from a ModelPool in the service; the CLI loads its own
+    if models is None:
+        models = Models()
+    models.reset()
+    models.set_metrics(metrics)
 
     # Detect Players and Ball
-    player_tracker = PlayerTracker(model_path='yolov8x')
-    ball_tracker = BallTracker(model_path='models/yolo5_last.pt')
-
-    player_detections = player_tracker.detect_frames(
-        video_frames,
-        read_from_stub=True,
-        stub_path="tracker_stubs/player_detections.pkl"
-    )
-
-    ball_detections = ball_tracker.detect_frames(
-        video_frames,
-        read_from_stub=True,
-        stub_path="tracker_stubs/ball_detections.pkl"
-    )
-    ball_detections = ball_tracker.interpolate_ball_positions(ball_detections)
+    player_tracker = models.player_tracker
+    ball_tracker = models.ball_tracker
+
+    if use_detection_cache and detection_cache is None:
+        detection_cache = DetectionCache()
+    # model stages are only recorded in this process, so not for sharded detection
+    with metrics.stage("detection", total_frames):
+        player_detections, ball_detections = detect_players_and_ball(
+            player_tracker,
+            ball_tracker,
+            get_frame_chunks,
+            input_video_path,
+            detection_cache=detection_cache if use_detection_cache else None,
+            batch_size=detection_batch_size,
+            num_shards=detection_shards,
+            shard_overlap=shard_overlap,
+            ball_max_stride=ball_detection_stride,
+            ball_roi_size=ball_roi_size,
+            progress_callback=lambda frames_processed: progress_callback("detection", frames_processed, total_frames)
+        )
+    progress_callback("analysis", 0, total_frames)
+
+    # inference calls made for this video (none when detections came from the cache)
+    detection_report = {
+        'player': player_tracker.get_detection_report(),
+        'ball': ball_tracker.get_detection_report(),
+    }
+    ball_report = detection_report['ball']
+    if ball_report['frames'] > 0:
+        print(f"👉 Ball detector ran on {ball_report['frames'] - ball_report['calls_saved']} of "
+              f"{ball_report['frames']} frames ({ball_report['calls_saved']} inference calls saved; "
+              f"{ball_report['roi_calls']} cropped, {ball_report['full_frame_calls']} full frame)")
+
+    with metrics.stage("ball_smoothing", ball_detections.num_frames):
+        if ball_smoothing == "kalman":
+            # causal: each frame's ball position only depends on earlier frames
+            ball_detections, _ = ball_tracker.filter_ball_track(ball_detections)
+        else:
+            ball_detections = ball_tracker.interpolate_ball_track(ball_detections, max_gap=ball_interpolation_max_gap)
     
     
     # Court Line Detector model
-    court_model_path = "models/keypoints_model.pth"
-    court_line_detector = CourtLineDetector(court_model_path)
-    court_keypoints = court_line_detector.predict(video_frames[0])
+    court_line_detector = models.court_line_detector
+    with metrics.stage("court_keypoints"):
+        if court_keypoint_mode == "track":
+            court_keypoint_tracker = CourtKeypointTracker(court_line_detector, max_segment_frames=court_max_segment_frames)
+            for video_frames in get_frame_chunks():
+                court_keypoint_tracker.update(video_frames)
+            court_keypoint_timeline = court_keypoint_tracker.get_timeline()
+            print(f"👉 Court keypoints detected on {len(court_keypoint_timeline)} camera segments")
+        elif court_keypoint_mode == "first_frame":
+            court_keypoint_timeline = CourtKeypointTimeline.constant(court_line_detector.predict(first_frame))
+        else:
+            raise ValueError(f"Unknown court keypoint mode: {court_keypoint_mode}")
+    # players are chosen on the first frame
+    court_keypoints = court_keypoint_timeline.get_keypoints(0)
 
     # choose players
-    player_detections = player_tracker.choose_and_filter_players(court_keypoints, player_detections)
+    with metrics.stage("player_selection"):
+        player_detections = player_tracker.choose_and_filter_players(court_keypoints, player_detections)
 
     # ----------------------------------------------------------
     # FIX: ALIGN FRAME COUNTS BETWEEN PLAYERS & BALL DETECTIONS
     # ----------------------------------------------------------
-    max_len = max(len(player_detections), len(ball_detections))
+    max_len = max(player_detections.num_frames, ball_detections.num_frames)
 
-    while len(player_detections) < max_len:
-        player_detections.append({})  # no players in that frame
-
-    while len(ball_detections) < max_len:
-        ball_detections.append({1: None})  # no ball in that frame
+    player_detections = player_detections.pad_frames(max_len)  # no players in those frames
+    ball_detections = ball_detections.pad_frames(max_len)  # no ball in those frames
     # ----------------------------------------------------------
 
     # MiniCourt
-    mini_court = MiniCourt(video_frames[0]) 
+    mini_court = MiniCourt(first_frame)
 
     # Detect ball shots
-    ball_shot_frames = ball_tracker.get_ball_shot_frames(ball_detections)
+    with metrics.stage("shot_detection", max_len):
+        ball_shot_frames = ball_tracker.get_ball_shot_frames_from_track(ball_detections)
 
     # Convert positions to mini court positions
-    player_mini_court_detections, ball_mini_court_detections = mini_court.convert_bounding_boxes_to_mini_court_coordinates(
-        player_detections, 
-        ball_detections,
-        court_keypoints
-    )
-
-    player_stats_data = [{
-        'frame_num':0,
-        'player_1_number_of_shots':0,
-        'player_1_total_shot_speed':0,
-        'player_1_last_shot_speed':0,
-        'player_1_total_player_speed':0,
-        'player_1_last_player_speed':0,
-
-        'player_2_number_of_shots':0,
-        'player_2_total_shot_speed':0,
-        'player_2_last_shot_speed':0,
-        'player_2_total_player_speed':0,
-        'player_2_last_player_speed':0,
-    }]
-    
-    for ball_shot_ind in range(len(ball_shot_frames)-1):
-        start_frame = ball_shot_frames[ball_shot_ind]
-        end_frame = ball_shot_frames[ball_shot_ind+1]
-        ball_shot_time_in_seconds = (end_frame-start_frame)/24 # 24fps
-
-        # Get distance covered by the ball
-        distance_covered_by_ball_pixels = measure_distance(
-            ball_mini_court_detections[start_frame][1],
-            ball_mini_court_detections[end_frame][1]
-        )
-
-        distance_covered_by_ball_meters = convert_pixel_distance_to_meters(
-            distance_covered_by_ball_pixels,
-            constants.DOUBLE_LINE_WIDTH,
-            mini_court.get_width_of_mini_court()
-        )
-
-        # Speed of the ball shot in km/h
-        speed_of_ball_shot = distance_covered_by_ball_meters/ball_shot_time_in_seconds * 3.6
-
-        # player who hit the ball
-        player_positions = player_mini_court_detections[start_frame]
-        player_shot_ball = min(
-            player_positions.keys(),
-            key=lambda player_id: measure_distance(
-                player_positions[player_id],
-                ball_mini_court_detections[start_frame][1]
-            )
-        )
-
-        # opponent
-        opponent_player_id = 1 if player_shot_ball == 2 else 2
-        distance_covered_by_opponent_pixels = measure_distance(
-            player_mini_court_detections[start_frame][opponent_player_id],
-            player_mini_court_detections[end_frame][opponent_player_id]
+    with metrics.stage("mini_court", max_len):
+        player_mini_court_detections, ball_mini_court_detections = mini_court.convert_tracks_with_keypoint_timeline(
+            player_detections, 
+            ball_detections,
+            court_keypoint_timeline,
+            mode=court_projection
         )
-
-        distance_covered_by_opponent_meters = convert_pixel_distance_to_meters(
-            distance_covered_by_opponent_pixels,
-            constants.DOUBLE_LINE_WIDTH,
-            mini_court.get_width_of_mini_court()
+        ball_mini_court_points, _ = ball_mini_court_detections.get_dense_track(1)
+
+    with metrics.stage("player_stats", max_len):
+        stats_engine = get_player_stats(
+            ball_shot_frames,
+            ball_mini_court_points,
+            player_mini_court_detections,
+            mini_court,
+            fps
         )
-
-        speed_of_opponent = distance_covered_by_opponent_meters/ball_shot_time_in_seconds * 3.6
-
-        current_player_stats = deepcopy(player_stats_data[-1])
-        current_player_stats['frame_num'] = start_frame
-        current_player_stats[f'player_{player_shot_ball}_number_of_shots'] += 1
-        current_player_stats[f'player_{player_shot_ball}_total_shot_speed'] += speed_of_ball_shot
-        current_player_stats[f'player_{player_shot_ball}_last_shot_speed'] = speed_of_ball_shot
-
-        current_player_stats[f'player_{opponent_player_id}_total_player_speed'] += speed_of_opponent
-        current_player_stats[f'player_{opponent_player_id}_last_player_speed'] = speed_of_opponent
-
-        player_stats_data.append(current_player_stats)
-
-    player_stats_data_df = pd.DataFrame(player_stats_data)
-    frames_df = pd.DataFrame({'frame_num': list(range(len(video_frames)))})
-    player_stats_data_df = pd.merge(frames_df, player_stats_data_df, on='frame_num', how='left')
-    player_stats_data_df = player_stats_data_df.ffill()
-
-    player_stats_data_df['player_1_average_shot_speed'] = (
-        player_stats_data_df['player_1_total_shot_speed'] /
-        player_stats_data_df['player_1_number_of_shots']
+        player_stats = stats_engine.get_frame_stats(max_len)
+        stats_text_alphas = get_stats_panel_text_alphas(player_stats, first_frame)
+
+    # Draw output: all layers in a single pass per frame, one chunk at a time,
+    # writing frames out as soon as they are rendered
+    compositor = FrameCompositor(num_workers=render_workers)
+    compositor.add_layer(track_layer(player_detections, player_tracker.draw_tracks_on_frame))
+    compositor.add_layer(track_layer(ball_detections, ball_tracker.draw_ball_on_frame))
+    compositor.add_layer(lambda frame, frame_num: court_line_detector.draw_keypoints(
+        frame, court_keypoint_timeline.get_keypoints(frame_num)))
+    compositor.add_layer(lambda frame, frame_num: mini_court.draw_mini_court_sprite(frame))
+    compositor.add_layer(track_layer(player_mini_court_detections, mini_court.draw_track_points_on_frame))
+    compositor.add_layer(track_layer(ball_mini_court_detections, mini_court.draw_track_points_on_frame, (0,255,255)))
+    compositor.add_layer(frame_layer(stats_text_alphas, draw_stats_panel))
+    compositor.add_layer(draw_frame_number)
+
+    # encode at the source's frame rate on a background thread while the next frames render
+    output_video_path = get_output_video_path(output_video_path, video_codec)
+    video_writer = BackgroundVideoWriter(
+        output_video_path,
+        (first_frame.shape[1], first_frame.shape[0]),
+        fps=fps,
+        codec=video_codec
     )
-    player_stats_data_df['player_2_average_shot_speed'] = (
-        player_stats_data_df['player_2_total_shot_speed'] /
-        player_stats_data_df['player_2_number_of_shots']
+    # spread over the shots; encoded as they are rendered, so the output never has to be decoded again
+    keyframe_nums = set()
+    if num_keyframe_thumbnails > 0 and ball_shot_frames:
+        shot_inds = np.linspace(0, len(ball_shot_frames) - 1, min(num_keyframe_thumbnails, len(ball_shot_frames)))
+        keyframe_nums = {ball_shot_frames[int(round(shot_ind))] for shot_ind in shot_inds}
+    keyframes = []
+    last_frame = None
+
+    frame_offset = 0
+    writer_report = None
+    progress_callback("rendering", 0, total_frames)
+    try:
+        for video_frames in get_frame_chunks():
+            with metrics.stage("rendering", len(video_frames), per_frame=True):
+                rendered_frames = compositor.render(video_frames, frame_offset)
+                for frame_num, frame in enumerate(rendered_frames, start=frame_offset):
+                    if frame_num in keyframe_nums:
+                        keyframes.append({'frame_num': frame_num, 'jpeg': encode_jpeg(frame, KEYFRAME_THUMBNAIL_WIDTH)})
+            last_frame = rendered_frames[-1] if rendered_frames else last_frame
+            # blocks while the writer's queue is full, i.e. when encoding is the bottleneck
+            with metrics.stage("writer_wait", len(rendered_frames)):
+                for frame in rendered_frames:
+                    video_writer.write(frame)
+            frame_offset += len(video_frames)
+            progress_callback("rendering", frame_offset, total_frames)
+
+        preview = None
+        if last_frame is not None:
+            preview = {'frame_num': frame_offset - 1, 'jpeg': encode_jpeg(last_frame)}
+        writer_report = video_writer.release()
+    finally:
+        compositor.close()
+        if writer_report is None:
+            # something above failed; don't leave the encoder thread, file or ffmpeg behind
+            video_writer.abort()
+    # on the writer's thread, overlapping the stages above
+    metrics.add_stage_time("encoding", writer_report['encode_seconds'], writer_report['frames'])
+    print(f"🎞️ Wrote {writer_report['frames']} frames to {output_video_path}: "
+          f"{writer_report['output_bytes'] / 1e6:.1f} MB, "
+          f"{(writer_report['bytes_per_minute'] or 0) / 1e6:.1f} MB and "
+          f"{writer_report['encode_seconds_per_minute'] or 0:.1f}s of encoding per minute of footage")
+
+    metrics.finish(frame_offset)
+    metrics_report = metrics.get_report()
+    # model stages are already part of the detection and court keypoint times
+    top_level_stages = {name: stage for name, stage in metrics_report['stages'].items() if name not in MODEL_STAGES}
+    slowest_stages = sorted(top_level_stages.items(), key=lambda item: item[1]['seconds'], reverse=True)[:3]
+    peak_rss = f"{metrics_report['peak_rss_mb']:.0f} MB" if metrics_report['peak_rss_mb'] is not None else "unknown"
+    print(f"⏱️ {frame_offset} frames in {metrics_report['wall_seconds']:.1f}s "
+          f"({metrics_report['fps'] or 0:.1f} fps), peak RSS {peak_rss}; slowest stages: "
+          + ", ".join(f"{name} {stage['seconds']:.1f}s" for name, stage in slowest_stages))
+
+    return {
+        'output_video_path': output_video_path,
+        'detection': detection_report,
+        'writer': writer_report,
+        'metrics': metrics_report,
+        'preview': preview,
+        'court_keypoints': court_keypoint_timeline.to_list(max_len),
+        'keyframes': keyframes,
+        'stats': {
+            'players': stats_engine.get_player_summaries(),
+            'shots': stats_engine.shots,
+        },
+    }
+
+
+def get_player_stats(ball_shot_frames, ball_mini_court_points, player_mini_court_detections, mini_court, fps=24):
+    """A PlayerStatsEngine with the shots between every pair of consecutive shot frames added."""
+    stats_engine = PlayerStatsEngine(mini_court.get_width_of_mini_court(), fps=fps)
+    stats_engine.add_shot_frames(ball_shot_frames, ball_mini_court_points, player_mini_court_detections)
+    return stats_engine
+
+
+def detect_players_and_ball(player_tracker, ball_tracker, get_frame_chunks, input_video_path,
+                            detection_cache=None, batch_size=1, num_shards=1, shard_overlap=32,
+                            ball_max_stride=1, ball_roi_size=None, progress_callback=None):
+    """
+    Player and ball detections for the whole video. Detections found in the
+    cache are reused; the rest are detected in one pass over the frame chunks
+    and stored in the cache. With num_shards > 1 the video is instead split
+    into overlapping shards detected in parallel processes and stitched back
+    together (see sharded_detection). ball_max_stride > 1 turns on the ball
+    tracker's adaptive stride and ball_roi_size its cropped inference.
+    """
+    trackers = {'player': player_tracker, 'ball': ball_tracker}
+    # extra detect_frames arguments; only non-default ones, so they also go into the cache keys
+    detect_params = {
+        'player': {},
+        'ball': {},
+    }
+    if ball_max_stride > 1:
+        detect_params['ball']['max_stride'] = ball_max_stride
+    if ball_roi_size is not None:
+        detect_params['ball']['roi_size'] = ball_roi_size
+    detections = {}
+    cache_keys = {}
+
+    if detection_cache is not None:
+        for name, tracker in trackers.items():
+            cache_keys[name] = get_detection_cache_key(detection_cache, name, tracker, input_video_path,
+                                                       num_shards, shard_overlap, detect_params[name])
+            cached_detections = detection_cache.load(cache_keys[name])
+            if cached_detections is not None:
+                print(f"👉 Loaded cached {name} detections!")
+                detections[name] = cached_detections
+
+    missing = [name for name in trackers if name not in detections]
+    if missing and num_shards > 1:
+        detections.update(detect_sharded(
+            input_video_path,
+            {name: trackers[name] for name in missing},
+            get_video_properties(input_video_path)['frame_count'],
+            num_shards,
+            overlap=shard_overlap,
+            batch_size=batch_size,
+            match_tracks=['player'],
+            detect_params=detect_params,
+            progress_callback=progress_callback
+        ))
+    elif missing:
+        chunk_detections = {name: [] for name in missing}
+        frames_processed = 0
+        for frames in get_frame_chunks():
+            for name in missing:
+                chunk_detections[name].append(
+                    trackers[name].detect_frames(frames, batch_size=batch_size, **detect_params[name])
+                )
+            frames_processed += len(frames)
+            if progress_callback is not None:
+                progress_callback(frames_processed)
+        for name in missing:
+            detections[name] = TrackStore.concatenate(chunk_detections[name])
+
+    if detection_cache is not None:
+        for name in missing:
+            detection_cache.save(cache_keys[name], detections[name])
+
+    return detections['player'], detections['ball']
+
+
+def get_detection_cache_key(detection_cache, name, tracker, input_video_path, num_shards=1, shard_overlap=32,
+                            detect_params=None):
+    params = dict(tracker.inference_params, **(detect_params or {}))
+    # stitched player tracks can be numbered differently from one sequential
+    # pass, and the ball's adaptive stride and ROI restart at every shard;
+    # plain per-frame ball detections come out the same either way
+    if num_shards > 1 and (name == 'player' or detect_params):
+        params.update(shards=num_shards, shard_overlap=shard_overlap)
+    # a bare model name like 'yolov8x' is downloaded to a weights file; key on
+    # the file's content so updated weights under the same name miss the cache
+    weights_path = getattr(tracker.model, 'ckpt_path', None) or tracker.model_path
+    return detection_cache.make_key(
+        input_video_path,
+        weights_path,
+        tracker=name,
+        **params
     )
-    player_stats_data_df['player_1_average_player_speed'] = (
-        player_stats_data_df['player_1_total_player_speed'] /
-        player_stats_data_df['player_2_number_of_shots']
-    )
-    player_stats_data_df['player_2_average_player_speed'] = (
-        player_stats_data_df['player_2_total_player_speed'] /
-        player_stats_data_df['player_1_number_of_shots']
-    )
-
-    # Draw output
-    output_video_frames = player_tracker.draw_bboxes(video_frames, player_detections)
-    output_video_frames = ball_tracker.draw_bboxes(output_video_frames, ball_detections)
-
-    output_video_frames = court_line_detector.draw_keypoints_on_video(output_video_frames, court_keypoints)
-
-    output_video_frames = mini_court.draw_mini_court(output_video_frames)
-    output_video_frames = mini_court.draw_points_on_mini_court(output_video_frames, player_mini_court_detections)
-    output_video_frames = mini_court.draw_points_on_mini_court(output_video_frames, ball_mini_court_detections, color=(0,255,255))    
-
-    output_video_frames = draw_player_stats(output_video_frames, player_stats_data_df)
-
-    for i, frame in enumerate(output_video_frames):
-        cv2.putText(frame, f"Frame: {i}", (10,30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
 
-    save_video(output_video_frames, "output_videos/output_video.avi")
 
+def draw_frame_number(frame, frame_num):
+    cv2.putText(frame, f"Frame: {frame_num}", (10,30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
+    return frame
 
 if __name__ == "__main__":
     main()
@@ -6,13 +6,10 @@ import constants
 from utils import (
     convert_meters_to_pixel_distance,
     convert_pixel_distance_to_meters,
-    get_foot_position,
-    get_closest_keypoint_index,
-    get_height_of_bbox,
     measure_xy_distance,
-    get_center_of_bbox,
-    measure_distance
+    sliding_window_max
 )
+from track_store import TrackStore
 
 class MiniCourt():
     def __init__(self,frame):
@@ -25,6 +22,7 @@ class MiniCourt():
         self.set_mini_court_position()
         self.set_court_drawing_key_points()
         self.set_court_lines()
+        self.set_mini_court_sprite(frame)
 
 
     def convert_meters_to_pixels(self, meters):
@@ -138,11 +136,48 @@ class MiniCourt():
 
         return out
 
+    def set_mini_court_sprite(self, frame):
+        """
+        Render the background box, court lines and keypoints once into a BGRA
+        sprite covering only the background box. draw_mini_court then only has
+        to alpha-blend this small patch into each frame.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        roi_start_x, roi_start_y = max(self.start_x, 0), max(self.start_y, 0)
+        roi_end_x, roi_end_y = min(self.end_x + 1, frame_width), min(self.end_y + 1, frame_height)
+        self.mini_court_roi = (roi_start_x, roi_start_y, roi_end_x, roi_end_y)
+
+        # draw the court on two canvases with different backgrounds: pixels that
+        # match in both belong to the court drawing, whatever their color
+        canvas_size = (self.end_y + 1, self.end_x + 1, 3)
+        court_on_black = self.draw_court(np.zeros(canvas_size, np.uint8))[roi_start_y:, roi_start_x:]
+        court_on_white = self.draw_court(np.full(canvas_size, 255, np.uint8))[roi_start_y:, roi_start_x:]
+        court_mask = (court_on_black == court_on_white).all(axis=2)
+
+        sprite = np.empty(court_on_black.shape[:2] + (4,), np.float32)
+        sprite[..., :3] = np.where(court_mask[..., None], court_on_black, 255)
+        # background box is blended 50/50 with the frame, court drawings are opaque
+        sprite[..., 3] = np.where(court_mask, 1.0, 0.5)
+        self.mini_court_sprite = sprite
+
+        # keep the part inside the frame in blend-ready form
+        clipped = sprite[:roi_end_y - roi_start_y, :roi_end_x - roi_start_x]
+        self.mini_court_sprite_premultiplied = clipped[..., :3] * clipped[..., 3:]
+        self.mini_court_sprite_inverse_alpha = 1.0 - clipped[..., 3:]
+
+    def draw_mini_court_sprite(self, frame):
+        roi_start_x, roi_start_y, roi_end_x, roi_end_y = self.mini_court_roi
+        roi = frame[roi_start_y:roi_end_y, roi_start_x:roi_end_x]
+
+        blended = roi * self.mini_court_sprite_inverse_alpha + self.mini_court_sprite_premultiplied
+        # round half to even, like cv2.addWeighted
+        roi[...] = np.rint(blended)
+        return frame
+
     def draw_mini_court(self,frames):
         output_frames = []
         for frame in frames:
-            frame = self.draw_background_rectangle(frame)
-            frame = self.draw_court(frame)
+            frame = self.draw_mini_court_sprite(frame)
             output_frames.append(frame)
         return output_frames
 
@@ -190,29 +225,188 @@ class MiniCourt():
 
         return  mini_court_player_position
 
-    def convert_bounding_boxes_to_mini_court_coordinates(self,player_boxes, ball_boxes, original_court_key_points ):
+    def get_max_player_heights(self, player_tracks, frames_before=20, frames_after=50):
+        """
+        For every row of player_tracks, the max bbox height in pixels of that
+        player over frames [frame_num-frames_before, frame_num+frames_after).
+        Each player's heights are put in one array and the window max is
+        computed in O(N); rows with no valid height nearby get -inf.
+        """
+        frame_nums = player_tracks.frame_nums
+        heights = player_tracks.coords[:, 3] - player_tracks.coords[:, 1]
+        max_heights = np.full(len(heights), -np.inf)
+
+        for player_id in np.unique(player_tracks.track_ids).tolist():
+            rows = player_tracks.track_ids == player_id
+            player_heights = np.full(player_tracks.num_frames, -np.inf)
+            valid_rows = rows & (heights > 0)
+            player_heights[frame_nums[valid_rows]] = heights[valid_rows]
+            window_max = sliding_window_max(player_heights, frames_before, frames_after)
+            max_heights[rows] = window_max[frame_nums[rows]]
+
+        return max_heights
+
+    def get_court_homography(self, original_court_key_points):
+        """
+        Fit the homography mapping the 14 detected court keypoints (video pixels)
+        onto the mini court drawing keypoints. Returns None if no fit is found.
+        """
+        court_points = np.asarray(original_court_key_points, dtype=np.float32).reshape(-1, 2)
+        drawing_points = np.asarray(self.drawing_key_points, dtype=np.float32).reshape(-1, 2)
+
+        # RANSAC so a single badly predicted keypoint doesn't skew the whole court
+        homography, _ = cv2.findHomography(court_points, drawing_points, cv2.RANSAC, 5.0)
+        if homography is None:
+            homography, _ = cv2.findHomography(court_points, drawing_points, 0)
+        return homography
+
+    def project_points_to_mini_court(self, points, homography):
+        # points: (N, 2) video pixel coordinates -> (N, 2) mini court coordinates
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        if len(points) == 0:
+            return np.empty((0, 2))
+        return cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+
+    def convert_tracks_with_homography(self, player_tracks, ball_track, homography):
+        """
+        Every player foot point and ball center of the video goes through one
+        batched perspective transform.
+        """
+        player_bboxes = player_tracks.coords
+        ball_bboxes = ball_track.coords
+
+        # players stand on the court at the bottom center of their box
+        foot_points = np.stack([(player_bboxes[:, 0] + player_bboxes[:, 2]) / 2, player_bboxes[:, 3]], axis=1)
+        ball_centers = np.stack([(ball_bboxes[:, 0] + ball_bboxes[:, 2]) / 2, (ball_bboxes[:, 1] + ball_bboxes[:, 3]) / 2], axis=1)
+
+        mini_court_points = self.project_points_to_mini_court(np.concatenate([foot_points, ball_centers]), homography)
+
+        return (player_tracks.with_coords(mini_court_points[:len(foot_points)]),
+                ball_track.with_coords(mini_court_points[len(foot_points):]))
+
+    def convert_tracks_with_keypoints(self, player_tracks, ball_track, original_court_key_points):
+        """
+        Measure the distance to the closest court keypoint (by y) and convert it
+        to mini court pixels, using the player's height as the pixel-to-metre
+        scale. Computed for all rows at once.
+        """
+        court_key_points = np.asarray(original_court_key_points)
+        drawing_key_points = np.asarray(self.drawing_key_points, dtype=np.float64).astype(int)
+        keypoint_indices = np.array([0, 2, 12, 13])
+
+        def to_mini_court(positions, heights_in_pixels, heights_in_meters):
+            # closest keypoint by y distance, first one on ties
+            keypoint_ys = court_key_points[keypoint_indices * 2 + 1]
+            closest = keypoint_indices[np.argmin(np.abs(positions[:, 1:2] - keypoint_ys[None, :]), axis=1)]
+
+            distance_x_pixels = np.abs(positions[:, 0] - court_key_points[closest * 2])
+            distance_y_pixels = np.abs(positions[:, 1] - court_key_points[closest * 2 + 1])
+
+            distance_x_meters = convert_pixel_distance_to_meters(distance_x_pixels, heights_in_meters, heights_in_pixels)
+            distance_y_meters = convert_pixel_distance_to_meters(distance_y_pixels, heights_in_meters, heights_in_pixels)
+
+            return np.stack([
+                drawing_key_points[closest * 2] + self.convert_meters_to_pixels(distance_x_meters),
+                drawing_key_points[closest * 2 + 1] + self.convert_meters_to_pixels(distance_y_meters),
+            ], axis=1)
+
+        # players: foot position, scaled by the max player height around the frame
+        player_bboxes = player_tracks.coords
+        foot_positions = np.stack([np.trunc((player_bboxes[:, 0] + player_bboxes[:, 2]) / 2), player_bboxes[:, 3]], axis=1)
+
+        player_heights_in_pixels = self.get_max_player_heights(player_tracks)
+        # fallback to a sane default to avoid division by zero
+        player_heights_in_pixels[~np.isfinite(player_heights_in_pixels)] = 150.0
+
+        player_heights_in_meters = np.where(
+            player_tracks.track_ids == 2,
+            constants.PLAYER_2_HEIGHT_METERS,
+            constants.PLAYER_1_HEIGHT_METERS
+        )
+        player_points = to_mini_court(foot_positions, player_heights_in_pixels, player_heights_in_meters)
+
+        # ball: center, scaled by the tallest player of its frame (or the default)
+        ball_bboxes = ball_track.coords
+        ball_positions = np.trunc(np.stack([(ball_bboxes[:, 0] + ball_bboxes[:, 2]) / 2,
+                                            (ball_bboxes[:, 1] + ball_bboxes[:, 3]) / 2], axis=1))
+
+        frame_heights_in_pixels = np.full(player_tracks.num_frames, -np.inf)
+        np.maximum.at(frame_heights_in_pixels, player_tracks.frame_nums, player_heights_in_pixels)
+        frame_heights_in_pixels[~np.isfinite(frame_heights_in_pixels)] = 150.0
+        ball_points = to_mini_court(ball_positions, frame_heights_in_pixels[ball_track.frame_nums],
+                                    constants.PLAYER_1_HEIGHT_METERS)
+
+        return player_tracks.with_coords(player_points), ball_track.with_coords(ball_points)
+
+    def convert_tracks_to_mini_court_coordinates(self, player_tracks, ball_track, original_court_key_points, mode="keypoint"):
+        """
+        Convert player and ball TrackStores (same number of frames) into
+        TrackStores of mini court points.
+
+        mode="keypoint" scales distances to the closest keypoint by the player
+        height, mode="homography" projects through the court homography.
+        """
+        if not player_tracks.all_valid:
+            player_tracks = player_tracks.select_rows(player_tracks.valid)
+
+        if mode == "homography":
+            homography = self.get_court_homography(original_court_key_points)
+            if homography is not None:
+                player_points, ball_points = self.convert_tracks_with_homography(player_tracks, ball_track, homography)
+            else:
+                print("⚠️ Court homography could not be fitted — using keypoint conversion.")
+                player_points, ball_points = self.convert_tracks_with_keypoints(player_tracks, ball_track, original_court_key_points)
+        elif mode == "keypoint":
+            player_points, ball_points = self.convert_tracks_with_keypoints(player_tracks, ball_track, original_court_key_points)
+        else:
+            raise ValueError(f"Unknown mini court conversion mode: {mode}")
+
+        # the ball has no mini court position where it has no box
+        ball_points = ball_points.with_coords(
+            ball_points.coords,
+            valid=ball_points.valid & np.isfinite(ball_points.coords).all(axis=1)
+        )
+        return player_points, ball_points
+
+    def convert_tracks_with_keypoint_timeline(self, player_tracks, ball_track, keypoint_timeline, mode="keypoint"):
+        """
+        convert_tracks_to_mini_court_coordinates with every segment of a
+        CourtKeypointTimeline converted with its own keypoints, so a camera
+        change doesn't skew the positions after it.
+        """
+        if len(keypoint_timeline) == 1:
+            return self.convert_tracks_to_mini_court_coordinates(
+                player_tracks, ball_track, keypoint_timeline.keypoints[0], mode=mode
+            )
+
+        player_segments = []
+        ball_segments = []
+        segment_ranges = keypoint_timeline.get_segment_ranges(player_tracks.num_frames)
+        for (start, end), keypoints in zip(segment_ranges, keypoint_timeline.keypoints):
+            if start == end:
+                continue
+            player_points, ball_points = self.convert_tracks_to_mini_court_coordinates(
+                player_tracks.slice_frames(start, end), ball_track.slice_frames(start, end), keypoints, mode=mode
+            )
+            player_segments.append(player_points)
+            ball_segments.append(ball_points)
+        return TrackStore.concatenate(player_segments), TrackStore.concatenate(ball_segments)
+
+    def convert_bounding_boxes_to_mini_court_coordinates(self,player_boxes, ball_boxes, original_court_key_points, mode="keypoint"):
         """
         Robust conversion that:
          - handles missing frames
          - handles missing player/ball bboxes
          - returns two lists of length = max(len(player_boxes), len(ball_boxes))
            where each element is a dict: player -> (x,y) and ball -> {1: (x,y) or None}
-        """
-        player_heights = {
-            1: constants.PLAYER_1_HEIGHT_METERS,
-            2: constants.PLAYER_2_HEIGHT_METERS
-        }
 
+        Adapter over convert_tracks_to_mini_court_coordinates for the list of
+        dicts format.
+        """
         max_len = max(len(player_boxes), len(ball_boxes))
-        output_player_boxes= []
-        output_ball_boxes= []
-
-        for frame_num in range(max_len):
-            # safe access to frame entries
-            player_bbox = player_boxes[frame_num] if frame_num < len(player_boxes) else {}
-            raw_ball_frame = ball_boxes[frame_num] if frame_num < len(ball_boxes) else {1: None}
 
-            # get ball box safely
+        ball_bboxes = np.full((len(ball_boxes), 4), np.nan)
+        for frame_num, raw_ball_frame in enumerate(ball_boxes):
             ball_box = None
             if isinstance(raw_ball_frame, dict):
                 ball_box = raw_ball_frame.get(1, None)
@@ -221,107 +415,20 @@ class MiniCourt():
                 first = raw_ball_frame[0]
                 if isinstance(first, list) and len(first) == 4:
                     ball_box = first
-
-            # compute ball center if available
-            ball_position = None
             if ball_box is not None:
-                try:
-                    ball_position = get_center_of_bbox(ball_box)
-                except Exception:
-                    ball_position = None
-
-            # prepare player outputs
-            output_player_bboxes_dict = {}
-            # collect heights to compute a reasonable player pixel-height fallback
-            collected_heights = []
-
-            # iterate players in this frame (may be empty)
-            for player_id, bbox in player_bbox.items():
-                if bbox is None:
-                    continue
-
-                # compute foot/anchor position
-                try:
-                    foot_position = get_foot_position(bbox)
-                except Exception:
-                    # fallback to bbox center if foot can't be computed
-                    try:
-                        foot_position = get_center_of_bbox(bbox)
-                    except Exception:
-                        continue
-
-                # Get The closest keypoint in pixels
-                try:
-                    closest_key_point_index = get_closest_keypoint_index(foot_position, original_court_key_points, [0,2,12,13])
-                except Exception:
-                    closest_key_point_index = 0
-
-                closest_key_point = (original_court_key_points[closest_key_point_index*2], 
-                                     original_court_key_points[closest_key_point_index*2+1])
-
-                # Get Player height in pixels (use surrounding frames safely)
-                frame_index_min = max(0, frame_num-20)
-                frame_index_max = min(max_len, frame_num+50)
-                bboxes_heights_in_pixels = []
-                for i in range(frame_index_min, frame_index_max):
-                    if i < len(player_boxes) and isinstance(player_boxes[i], dict) and player_id in player_boxes[i]:
-                        hb = player_boxes[i][player_id]
-                        try:
-                            h = get_height_of_bbox(hb)
-                            if h is not None and h > 0:
-                                bboxes_heights_in_pixels.append(h)
-                        except Exception:
-                            pass
-                max_player_height_in_pixels = max(bboxes_heights_in_pixels) if bboxes_heights_in_pixels else None
-                if max_player_height_in_pixels is None or max_player_height_in_pixels == 0:
-                    # fallback to a sane default to avoid division by zero
-                    max_player_height_in_pixels = 150.0
-
-                collected_heights.append(max_player_height_in_pixels)
-
-                # compute mini-court coordinates for this player
-                mini_court_player_position = self.get_mini_court_coordinates(
-                    foot_position,
-                    closest_key_point, 
-                    closest_key_point_index, 
-                    max_player_height_in_pixels,
-                    player_heights.get(player_id, constants.PLAYER_1_HEIGHT_METERS)
-                )
-                
-                output_player_bboxes_dict[player_id] = mini_court_player_position
-
-            # compute ball mini-court position:
-            ball_mini_position = None
-            if ball_position is not None:
-                # choose a sensible pixel-height to convert from: use max of collected player heights or default
-                fallback_player_pixel_height = max(collected_heights) if collected_heights else 150.0
-
-                try:
-                    ball_closest_key_point_index = get_closest_keypoint_index(ball_position, original_court_key_points, [0,2,12,13])
-                except Exception:
-                    ball_closest_key_point_index = 0
-
-                ball_closest_key_point = (original_court_key_points[ball_closest_key_point_index*2],
-                                          original_court_key_points[ball_closest_key_point_index*2+1])
-
-                # convert ball center to mini-court coords using fallback height and an arbitrary player-meter height (use PLAYER_1)
-                try:
-                    ball_mini_position = self.get_mini_court_coordinates(
-                        ball_position,
-                        ball_closest_key_point,
-                        ball_closest_key_point_index,
-                        fallback_player_pixel_height,
-                        constants.PLAYER_1_HEIGHT_METERS
-                    )
-                except Exception:
-                    ball_mini_position = None
-
-            # append outputs for this frame (ensure consistent length)
-            output_player_boxes.append(output_player_bboxes_dict)
-            output_ball_boxes.append({1: ball_mini_position} if ball_mini_position is not None else {1: None})
-
-        return output_player_boxes , output_ball_boxes
-    
+                ball_bboxes[frame_num] = ball_box
+
+        player_tracks = TrackStore.from_detections(player_boxes).pad_frames(max_len)
+        ball_track = TrackStore.from_dense(1, ball_bboxes).pad_frames(max_len)
+
+        player_points, ball_points = self.convert_tracks_to_mini_court_coordinates(
+            player_tracks, ball_track, original_court_key_points, mode=mode
+        )
+
+        output_ball_boxes = ball_points.to_detections(as_tuples=True)
+        output_ball_boxes = [frame if frame else {1: None} for frame in output_ball_boxes]
+        return player_points.to_detections(as_tuples=True), output_ball_boxes
+
     def draw_points_on_mini_court(self,frames,postions, color=(0,255,0)):
         """
         Draw points from 'positions' onto frames.
@@ -331,17 +438,25 @@ class MiniCourt():
         for frame_num, frame in enumerate(frames):
             if frame_num >= len(postions):
                 continue
-            frame_positions = postions[frame_num]
-            if not isinstance(frame_positions, dict):
-                continue
-            for _, position in frame_positions.items():
-                if position is None:
-                    continue
-                try:
-                    x,y = position
-                except Exception:
-                    continue
-                x= int(x)
-                y= int(y)
-                cv2.circle(frame, (x,y), 5, color, -1)
+            self.draw_points_on_frame(frame, postions[frame_num], color)
         return frames
+
+    def draw_track_points_on_frame(self, frame, track_ids, points, color=(0,255,0)):
+        for x, y in np.asarray(points).tolist():
+            cv2.circle(frame, (int(x),int(y)), 5, color, -1)
+        return frame
+
+    def draw_points_on_frame(self, frame, frame_positions, color=(0,255,0)):
+        if not isinstance(frame_positions, dict):
+            return frame
+        for _, position in frame_positions.items():
+            if position is None:
+                continue
+            try:
+                x,y = position
+            except Exception:
+                continue
+            x= int(x)
+            y= int(y)
+            cv2.circle(frame, (x,y), 5, color, -1)
+        return frame
@@ -0,0 +1,86 @@
+import os
+import queue
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import torch
+
+from trackers import PlayerTracker, BallTracker
+from court_line_detector import CourtLineDetector
+
+PLAYER_MODEL_PATH = 'yolov8x'
+BALL_MODEL_PATH = 'models/yolo5_last.pt'
+COURT_MODEL_PATH = 'models/keypoints_model.pth'
+
+
+class Models:
+    """One player tracker, ball tracker and court line detector, used by one video at a time."""
+    def __init__(self, player_model_path=PLAYER_MODEL_PATH, ball_model_path=BALL_MODEL_PATH,
+                 court_model_path=COURT_MODEL_PATH):
+        self.player_tracker = PlayerTracker(model_path=player_model_path)
+        self.ball_tracker = BallTracker(model_path=ball_model_path)
+        self.court_line_detector = CourtLineDetector(court_model_path)
+
+    def warmup(self, frame_size=(640, 640)):
+        # the first call sets up the predictors and fuses layers; do it before
+        # any request is waiting on it
+        frame = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+        self.player_tracker.detect_frames([frame])
+        self.ball_tracker.detect_frames([frame])
+        self.court_line_detector.predict(frame)
+        self.reset()
+
+    def reset(self):
+        # drop track and stride state so nothing from one video carries into the next
+        self.player_tracker.reset()
+        self.ball_tracker.reset()
+        self.court_line_detector.metrics = None
+
+    def set_metrics(self, metrics):
+        # model calls are timed into metrics (a PipelineMetrics) until the next reset()
+        self.player_tracker.metrics = metrics
+        self.ball_tracker.metrics = metrics
+        self.court_line_detector.metrics = metrics
+
+
+def pin_threads(num_threads):
+    # torch's intra-op pool and OpenCV's pool are process wide, so concurrent
+    # jobs share the cores instead of each one spawning a thread per core
+    torch.set_num_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+
+
+class ModelPool:
+    """
+    Process-level registry of loaded models. pool_size model sets are loaded
+    once at startup and lent out to jobs with acquire(), so each set is only
+    ever used by one video at a time and jobs never pay the load time.
+
+    num_threads defaults to the CPU count divided between the pool's sets.
+    Every player tracker numbers its tracks from a counter of its own (see
+    player_tracker.use_own_track_ids), so videos processed at the same time
+    don't take track ids from each other.
+    """
+    def __init__(self, pool_size=1, num_threads=None, warmup=True, **model_paths):
+        if num_threads is None:
+            num_threads = max(1, (os.cpu_count() or 1) // pool_size)
+        self.num_threads = num_threads
+        pin_threads(num_threads)
+
+        self.available = queue.Queue()
+        for _ in range(pool_size):
+            models = Models(**model_paths)
+            if warmup:
+                models.warmup()
+            self.available.put(models)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Borrow a model set, blocking until one is free; reset before it is handed out."""
+        models = self.available.get(timeout=timeout)
+        try:
+            models.reset()
+            yield models
+        finally:
+            self.available.put(models)
@@ -0,0 +1,157 @@
+import numpy as np
+
+import constants
+from utils import measure_distance, convert_pixel_distance_to_meters
+
+# accumulated per player; a player's speed is measured while the opponent's shot travels
+STATS = ('number_of_shots', 'total_shot_speed', 'last_shot_speed', 'total_player_speed', 'last_player_speed')
+NUMBER_OF_SHOTS, TOTAL_SHOT_SPEED, LAST_SHOT_SPEED, TOTAL_PLAYER_SPEED, LAST_PLAYER_SPEED = range(len(STATS))
+PLAYER_NUMS = (1, 2)
+
+
+class PlayerStatsEngine:
+    """
+    Shot and player speed stats for players 1 and 2, kept as running
+    accumulators that add_shot() updates one shot at a time. Every shot also
+    stores a snapshot of the accumulators from its first frame on, so
+    per-frame stat columns for any range of frames are a searchsorted lookup
+    into the snapshots instead of one row per frame built up front; a
+    streaming renderer can ask for each chunk's columns as shots come in.
+
+    Averages are NaN until the shots they are taken over exist, as before.
+    """
+    def __init__(self, mini_court_width, fps=24):
+        self.mini_court_width = mini_court_width
+        self.fps = fps
+
+        # rows are players 1 and 2, columns STATS
+        self.totals = np.zeros((len(PLAYER_NUMS), len(STATS)))
+        # snapshot i of the totals applies from frame snapshot_frames[i] on
+        self.snapshot_frames = [0]
+        self.snapshots = [self.totals.copy()]
+        self.shots = []
+
+    def get_speed(self, distance_pixels, seconds):
+        # km/h from a mini court distance
+        distance_meters = convert_pixel_distance_to_meters(distance_pixels, constants.DOUBLE_LINE_WIDTH, self.mini_court_width)
+        return distance_meters / seconds * 3.6
+
+    def add_shot(self, start_frame, end_frame, ball_start, ball_end, player_positions_start, player_positions_end):
+        """
+        Add the shot hit at start_frame and answered at end_frame. The ball
+        positions and player positions ({player_num: point}) are mini court
+        points on those two frames. The player closest to the ball hit it;
+        the opponent's speed is how far they moved until the next shot.
+        Returns the shot's record.
+        """
+        seconds = (end_frame - start_frame) / self.fps
+        shot_speed = self.get_speed(measure_distance(ball_start, ball_end), seconds)
+
+        player_num = min(
+            player_positions_start.keys(),
+            key=lambda player_id: measure_distance(player_positions_start[player_id], ball_start)
+        )
+        opponent_num = 1 if player_num == 2 else 2
+        opponent_speed = self.get_speed(
+            measure_distance(player_positions_start[opponent_num], player_positions_end[opponent_num]),
+            seconds
+        )
+
+        player, opponent = self.totals[player_num - 1], self.totals[opponent_num - 1]
+        player[NUMBER_OF_SHOTS] += 1
+        player[TOTAL_SHOT_SPEED] += shot_speed
+        player[LAST_SHOT_SPEED] = shot_speed
+        opponent[TOTAL_PLAYER_SPEED] += opponent_speed
+        opponent[LAST_PLAYER_SPEED] = opponent_speed
+
+        self.snapshot_frames.append(start_frame)
+        self.snapshots.append(self.totals.copy())
+
+        shot = {
+            'shot_num': len(self.shots) + 1,
+            'start_frame': int(start_frame),
+            'end_frame': int(end_frame),
+            'duration_seconds': float(seconds),
+            'player': int(player_num),
+            'shot_speed_kmh': float(shot_speed),
+            'opponent_speed_kmh': float(opponent_speed),
+        }
+        self.shots.append(shot)
+        return shot
+
+    def add_shot_frames(self, ball_shot_frames, ball_mini_court_points, player_mini_court_detections):
+        """
+        Add the shots between consecutive frames of ball_shot_frames that
+        were not added yet, so it can be called again as the list grows.
+        ball_mini_court_points has one point per frame and
+        player_mini_court_detections is a TrackStore with players 1 and 2.
+        Returns the new shots' records.
+        """
+        new_shots = []
+        for shot_ind in range(len(self.shots), len(ball_shot_frames) - 1):
+            start_frame = ball_shot_frames[shot_ind]
+            end_frame = ball_shot_frames[shot_ind + 1]
+            new_shots.append(self.add_shot(
+                start_frame,
+                end_frame,
+                ball_mini_court_points[start_frame],
+                ball_mini_court_points[end_frame],
+                player_mini_court_detections.get_frame_dict(start_frame),
+                player_mini_court_detections.get_frame_dict(end_frame)
+            ))
+        return new_shots
+
+    def get_stats(self):
+        """The current totals as {'player_<n>_<stat>': value}."""
+        return {
+            f'player_{player_num}_{stat}': float(self.totals[player_num - 1, stat_ind])
+            for player_num in PLAYER_NUMS
+            for stat_ind, stat in enumerate(STATS)
+        }
+
+    def get_frame_stats(self, num_frames, start_frame=0):
+        """
+        Stat columns for frames start_frame .. start_frame+num_frames-1, as
+        {'player_<n>_<stat>': array with one value per frame}, plus
+        'frame_num' and the average shot and player speed columns.
+        """
+        frame_nums = np.arange(start_frame, start_frame + num_frames)
+        # the last snapshot taken at or before each frame
+        snapshot_inds = np.searchsorted(self.snapshot_frames, frame_nums, side='right') - 1
+        frame_totals = np.asarray(self.snapshots)[snapshot_inds]
+
+        frame_stats = {'frame_num': frame_nums}
+        for player_num in PLAYER_NUMS:
+            for stat_ind, stat in enumerate(STATS):
+                frame_stats[f'player_{player_num}_{stat}'] = frame_totals[:, player_num - 1, stat_ind]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for player_num, opponent_num in ((1, 2), (2, 1)):
+                frame_stats[f'player_{player_num}_average_shot_speed'] = (
+                    frame_stats[f'player_{player_num}_total_shot_speed'] /
+                    frame_stats[f'player_{player_num}_number_of_shots']
+                )
+                frame_stats[f'player_{player_num}_average_player_speed'] = (
+                    frame_stats[f'player_{player_num}_total_player_speed'] /
+                    frame_stats[f'player_{opponent_num}_number_of_shots']
+                )
+        for player_num in PLAYER_NUMS:
+            frame_stats[f'player_{player_num}_number_of_shots'] = \
+                frame_stats[f'player_{player_num}_number_of_shots'].astype(np.int64)
+        return frame_stats
+
+    def get_player_summaries(self):
+        """Per-player totals and averages so far; averages are None without the shots to take them over."""
+        summaries = {}
+        for player_num, opponent_num in ((1, 2), (2, 1)):
+            player, opponent = self.totals[player_num - 1], self.totals[opponent_num - 1]
+            summaries[f'player_{player_num}'] = {
+                'number_of_shots': int(player[NUMBER_OF_SHOTS]),
+                'last_shot_speed_kmh': float(player[LAST_SHOT_SPEED]),
+                'average_shot_speed_kmh':
+                    float(player[TOTAL_SHOT_SPEED] / player[NUMBER_OF_SHOTS]) if player[NUMBER_OF_SHOTS] else None,
+                'last_player_speed_kmh': float(player[LAST_PLAYER_SPEED]),
+                'average_player_speed_kmh':
+                    float(player[TOTAL_PLAYER_SPEED] / opponent[NUMBER_OF_SHOTS]) if opponent[NUMBER_OF_SHOTS] else None,
+            }
+        return summaries
@@ -1,58 +1,94 @@
 import numpy as np
 import cv2
 
+STATS_PANEL_WIDTH = 350
+STATS_PANEL_HEIGHT = 230
+
+def get_stats_panel_position(frame):
+    start_x = frame.shape[1]-400
+    start_y = frame.shape[0]-500
+    end_x = start_x+STATS_PANEL_WIDTH
+    end_y = start_y+STATS_PANEL_HEIGHT
+    return start_x, start_y, end_x, end_y
+
+def get_stats_panel_texts(player_1_shot_speed, player_2_shot_speed, player_1_speed, player_2_speed,
+                          avg_player_1_shot_speed, avg_player_2_shot_speed, avg_player_1_speed, avg_player_2_speed):
+    # (text, (x, y) relative to the panel corner, font scale, thickness)
+    return (
+        ("     Player 1     Player 2", (80, 30), 0.6, 2),
+        ("Shot Speed", (10, 80), 0.45, 1),
+        (f"{player_1_shot_speed:.1f} km/h    {player_2_shot_speed:.1f} km/h", (130, 80), 0.5, 2),
+        ("Player Speed", (10, 120), 0.45, 1),
+        (f"{player_1_speed:.1f} km/h    {player_2_speed:.1f} km/h", (130, 120), 0.5, 2),
+        ("avg. S. Speed", (10, 160), 0.45, 1),
+        (f"{avg_player_1_shot_speed:.1f} km/h    {avg_player_2_shot_speed:.1f} km/h", (130, 160), 0.5, 2),
+        ("avg. P. Speed", (10, 200), 0.45, 1),
+        (f"{avg_player_1_speed:.1f} km/h    {avg_player_2_speed:.1f} km/h", (130, 200), 0.5, 2),
+    )
+
+def render_stats_text_alpha(panel_texts, width, height):
+    """
+    Rasterize the panel texts once into a coverage map (0..1) of the panel
+    area, which may be wider than the box when text overflows it.
+    """
+    canvas = np.zeros((height, width), np.uint8)
+    for text, position, font_scale, thickness in panel_texts:
+        cv2.putText(canvas, text, position, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255, thickness)
+    return canvas.astype(np.float32) / 255
+
+def draw_stats_panel(frame, text_alpha):
+    start_x, start_y, end_x, end_y = get_stats_panel_position(frame)
+
+    # darken only the box: 50/50 blend with black
+    box_start_x, box_start_y = max(start_x, 0), max(start_y, 0)
+    box = frame[box_start_y:end_y+1, box_start_x:end_x+1]
+    box[...] = cv2.addWeighted(box, 0.5, box, 0, 0)
+
+    # blend white text in, touching only the pixels the text covers
+    text_area = frame[box_start_y:start_y+text_alpha.shape[0], box_start_x:start_x+text_alpha.shape[1]]
+    visible_alpha = text_alpha[box_start_y-start_y:, box_start_x-start_x:][:text_area.shape[0], :text_area.shape[1]]
+    text_mask = visible_alpha > 0
+    pixels = text_area[text_mask].astype(np.float32)
+    text_area[text_mask] = np.rint(pixels + (255 - pixels) * visible_alpha[text_mask][:, None])
+    return frame
+
+def get_stats_panel_text_alphas(player_stats, frame):
+    """
+    One text coverage map per row of player_stats (a DataFrame or a dict of
+    per-frame columns), for a frame the size of 'frame'. Stats only change on shot frames, so the text is rasterized again
+    only when what it would display changes; other rows share the same map.
+    """
+    columns = [
+        'player_1_last_shot_speed', 'player_2_last_shot_speed',
+        'player_1_last_player_speed', 'player_2_last_player_speed',
+        'player_1_average_shot_speed', 'player_2_average_shot_speed',
+        'player_1_average_player_speed', 'player_2_average_player_speed',
+    ]
+    stats_columns = [np.asarray(player_stats[column]) for column in columns]
+    start_x, _, _, _ = get_stats_panel_position(frame)
+
+    text_alphas = []
+    panel_texts = None
+    text_alpha = None
+
+    for row_num in range(len(stats_columns[0])):
+        row_texts = get_stats_panel_texts(*(column[row_num] for column in stats_columns))
+        if row_texts != panel_texts:
+            panel_texts = row_texts
+            text_alpha = render_stats_text_alpha(panel_texts, frame.shape[1] - start_x, STATS_PANEL_HEIGHT + 1)
+        text_alphas.append(text_alpha)
+
+    return text_alphas
+
 def draw_player_stats(output_video_frames,player_stats):
 
-    for index, row in player_stats.iterrows():
-        player_1_shot_speed = row['player_1_last_shot_speed']
-        player_2_shot_speed = row['player_2_last_shot_speed']
-        player_1_speed = row['player_1_last_player_speed']
-        player_2_speed = row['player_2_last_player_speed']
-
-        avg_player_1_shot_speed = row['player_1_average_shot_speed']
-        avg_player_2_shot_speed = row['player_2_average_shot_speed']
-        avg_player_1_speed = row['player_1_average_player_speed']
-        avg_player_2_speed = row['player_2_average_player_speed']
-
-        frame = output_video_frames[index]
-        shapes = np.zeros_like(frame, np.uint8)
-
-        width=350
-        height=230
-
-        start_x = frame.shape[1]-400
-        start_y = frame.shape[0]-500
-        end_x = start_x+width
-        end_y = start_y+height
-
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (start_x, start_y), (end_x, end_y), (0, 0, 0), -1)
-        alpha = 0.5 
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-        output_video_frames[index] = frame
-
-        text = "     Player 1     Player 2"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+80, start_y+30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        text = "Shot Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+80), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{player_1_shot_speed:.1f} km/h    {player_2_shot_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+80), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-        text = "Player Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+120), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{player_1_speed:.1f} km/h    {player_2_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-        
-        
-        text = "avg. S. Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+160), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{avg_player_1_shot_speed:.1f} km/h    {avg_player_2_shot_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+160), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-        
-        text = "avg. P. Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+200), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{avg_player_1_speed:.1f} km/h    {avg_player_2_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-    
-    return output_video_frames
\ No newline at end of file
+    if len(player_stats) == 0:
+        return output_video_frames
+
+    first_index = player_stats.index[0]
+    text_alphas = get_stats_panel_text_alphas(player_stats, output_video_frames[first_index])
+
+    for index, text_alpha in zip(player_stats.index, text_alphas):
+        output_video_frames[index] = draw_stats_panel(output_video_frames[index], text_alpha)
+
+    return output_video_frames
@@ -1,22 +1,64 @@
 from ultralytics import YOLO 
+import itertools
 import cv2
-import pickle
+import numpy as np
 import sys
 sys.path.append('../')
 from utils import measure_distance, get_center_of_bbox
+from track_store import TrackStore
+from instrumentation import measure
+
+
+def use_own_track_ids(tracker):
+    """
+    Make an Ultralytics tracker number its tracks from a counter of its own.
+    Older releases take every track id from one class-level counter that each
+    new tracker restarts, so a video tracked while another one starts would
+    hand out ids it had already used.
+    """
+    track_ids = itertools.count(1)
+    init_track = tracker.init_track
+
+    def init_track_with_own_ids(*args, **kwargs):
+        # tracks get their id from self.next_id() when activated
+        tracks = init_track(*args, **kwargs)
+        for track in tracks:
+            track.next_id = track_ids.__next__
+        return tracks
+
+    tracker.init_track = init_track_with_own_ids
+    tracker.has_own_track_ids = True
+
 
 class PlayerTracker:
-    def __init__(self,model_path):
+    def __init__(self,model_path, conf=None, imgsz=None):
+        self.model_path = model_path
         self.model = YOLO(model_path)
 
+        # only parameters that were set are passed to the model (and into cache keys)
+        self.inference_params = {}
+        if conf is not None:
+            self.inference_params['conf'] = conf
+        if imgsz is not None:
+            self.inference_params['imgsz'] = imgsz
+
+        self.frames_seen = 0
+        self.frames_detected = 0
+        # (tracker generation, model track id) -> this video's track id, see get_track_id
+        self.track_ids = {}
+        # counts the trackers the model has created, so ids of an earlier one are never mixed up with the current one's
+        self.tracker_generation = 0
+        # PipelineMetrics of the video being processed, set by main; None records nothing
+        self.metrics = None
+
+        # runs after model.track has set up its trackers and before their first update
+        self.model.add_callback("on_predict_batch_start", self.on_predict_batch_start)
+
     def choose_and_filter_players(self, court_keypoints, player_detections):
-        player_detections_first_frame = player_detections[0]
+        # player_detections is a TrackStore
+        player_detections_first_frame = player_detections.get_frame_dict(0)
         chosen_player = self.choose_players(court_keypoints, player_detections_first_frame)
-        filtered_player_detections = []
-        for player_dict in player_detections:
-            filtered_player_dict = {track_id: bbox for track_id, bbox in player_dict.items() if track_id in chosen_player}
-            filtered_player_detections.append(filtered_player_dict)
-        return filtered_player_detections
+        return player_detections.filter_tracks(chosen_player)
 
     def choose_players(self, court_keypoints, player_dict):
         distances = []
@@ -37,27 +79,82 @@ class PlayerTracker:
         chosen_players = [distances[0][0], distances[1][0]]
         return chosen_players
 
+    def reset(self):
+        # model.track(persist=True) keeps its trackers on the predictor between
+        # calls; drop them so the next video starts from fresh track ids
+        predictor = getattr(self.model, 'predictor', None)
+        if predictor is not None and hasattr(predictor, 'trackers'):
+            del predictor.trackers
+        self.frames_seen = 0
+        self.frames_detected = 0
+        # the trackers are gone, so ids start over with the next one's
+        self.track_ids = {}
+        self.tracker_generation = 0
+        self.metrics = None
 
-    def detect_frames(self,frames, read_from_stub=False, stub_path=None):
-        player_detections = []
+    def on_predict_batch_start(self, predictor):
+        for tracker in getattr(predictor, 'trackers', []):
+            if not getattr(tracker, 'has_own_track_ids', False):
+                use_own_track_ids(tracker)
+                self.tracker_generation += 1
 
-        if read_from_stub and stub_path is not None:
-            with open(stub_path, 'rb') as f:
-                player_detections = pickle.load(f)
-            return player_detections
+    def get_track_id(self, model_track_id):
+        # each video numbers its tracks 1, 2, ... in order of appearance
+        key = (self.tracker_generation, model_track_id)
+        return self.track_ids.setdefault(key, len(self.track_ids) + 1)
 
-        for frame in frames:
-            player_dict = self.detect_frame(frame)
-            player_detections.append(player_dict)
-        
-        if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(player_detections, f)
-        
-        return player_detections
+
+    def detect_frames(self,frames, batch_size=1):
+        frame_arrays = []
+
+        # frames are sent to the model batch_size at a time; persist=True keeps
+        # the tracker (and its track ids) alive across batches
+        for batch_start in range(0, len(frames), batch_size):
+            batch_frames = frames[batch_start:batch_start+batch_size]
+            frame_arrays.extend(self.detect_batch(batch_frames))
+
+        self.frames_seen += len(frames)
+        self.frames_detected += len(frames)
+        return TrackStore.from_frame_arrays(frame_arrays)
+
+    def get_detection_report(self):
+        return {
+            'frames': self.frames_seen,
+            'inference_calls': self.frames_detected,
+            'calls_saved': self.frames_seen - self.frames_detected,
+        }
+
+    def merge_detection_report(self, report):
+        # add counts from a worker process that detected part of this video
+        self.frames_seen += report['frames']
+        self.frames_detected += report['inference_calls']
+
+    def detect_batch(self, frames):
+        with measure(self.metrics, 'player_model', len(frames), per_frame=True):
+            results = self.model.track(list(frames), persist=True, **self.inference_params)
+        return [self.get_player_arrays(result) for result in results]
 
     def detect_frame(self,frame):
-        results = self.model.track(frame, persist=True)[0]
+        with measure(self.metrics, 'player_model', 1, per_frame=True):
+            results = self.model.track(frame, persist=True, **self.inference_params)[0]
+        return self.get_player_dict(results)
+
+    def get_player_arrays(self, results):
+        # (track_ids, bboxes, confidences) of the people in one result
+        boxes = results.boxes
+        if len(boxes) == 0 or boxes.id is None:
+            return np.empty(0, np.int64), np.empty((0, 4)), np.empty(0, np.float32)
+
+        id_name_dict = results.names
+        is_person = np.array([id_name_dict[int(cls_id)] == "person" for cls_id in boxes.cls.tolist()], dtype=bool)
+        track_ids = [self.get_track_id(int(track_id)) for track_id in boxes.id.cpu().numpy()[is_person]]
+        return (
+            np.array(track_ids, dtype=np.int64),
+            boxes.xyxy.cpu().numpy().astype(np.float64)[is_person],
+            boxes.conf.cpu().numpy().astype(np.float32)[is_person],
+        )
+
+    def get_player_dict(self, results):
         id_name_dict = results.names
 
         player_dict = {}
@@ -67,21 +164,28 @@ class PlayerTracker:
             object_cls_id = box.cls.tolist()[0]
             object_cls_name = id_name_dict[object_cls_id]
             if object_cls_name == "person":
-                player_dict[track_id] = result
+                player_dict[self.get_track_id(track_id)] = result
         
         return player_dict
 
     def draw_bboxes(self,video_frames, player_detections):
         output_video_frames = []
         for frame, player_dict in zip(video_frames, player_detections):
-            # Draw Bounding Boxes
-            for track_id, bbox in player_dict.items():
-                x1, y1, x2, y2 = bbox
-                cv2.putText(frame, f"Player ID: {track_id}",(int(bbox[0]),int(bbox[1] -10 )),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+            frame = self.draw_bboxes_on_frame(frame, player_dict)
             output_video_frames.append(frame)
         
         return output_video_frames
 
+    def draw_bboxes_on_frame(self, frame, player_dict):
+        return self.draw_tracks_on_frame(frame, list(player_dict.keys()), list(player_dict.values()))
+
+    def draw_tracks_on_frame(self, frame, track_ids, bboxes):
+        # Draw Bounding Boxes
+        for track_id, bbox in zip(np.asarray(track_ids).tolist(), np.asarray(bboxes).tolist()):
+            x1, y1, x2, y2 = bbox
+            cv2.putText(frame, f"Player ID: {track_id}",(int(bbox[0]),int(bbox[1] -10 )),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+        return frame
+
 
     
\ No newline at end of file
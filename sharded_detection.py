@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils import read_video_range, get_bbox_ious
+from model_pool import pin_threads
+from track_store import TrackStore
+
+
+def get_shard_ranges(num_frames, num_shards, overlap):
+    """
+    (start, end) frame ranges splitting a video into num_shards shards. Every
+    shard but the first also covers the last 'overlap' frames of the previous
+    one, and the last shard runs to the end of the video (end=None) in case
+    the container's frame count is short.
+    """
+    num_shards = max(1, min(num_shards, num_frames))
+    boundaries = [num_frames * shard_num // num_shards for shard_num in range(num_shards + 1)]
+    ranges = []
+    for shard_num in range(num_shards):
+        start = max(boundaries[shard_num] - overlap, 0) if shard_num > 0 else 0
+        end = boundaries[shard_num + 1] if shard_num < num_shards - 1 else None
+        ranges.append((start, end))
+    return ranges
+
+
+# =======================================================
+#   WORKER PROCESS
+# =======================================================
+# built once per worker process by init_shard_worker
+_shard_trackers = None
+
+def init_shard_worker(num_threads, tracker_specs):
+    global _shard_trackers
+    pin_threads(num_threads)
+    _shard_trackers = {
+        name: tracker_class(model_path=model_path, **inference_params)
+        for name, (tracker_class, model_path, inference_params) in tracker_specs.items()
+    }
+
+
+def get_shard_reports():
+    return {name: tracker.get_detection_report() for name, tracker in _shard_trackers.items()}
+
+
+def detect_shard(video_path, start_frame, end_frame, batch_size=1, chunk_size=64, detect_params=None, overlap=0):
+    """
+    Detections for frames start_frame:end_frame, and the trackers' reports
+    for all but the first 'overlap' of them, which the previous shard has
+    already counted.
+    """
+    # a worker may get several shards; each one starts with fresh tracks
+    for tracker in _shard_trackers.values():
+        tracker.reset()
+    detect_params = detect_params or {}
+
+    chunk_detections = {name: [] for name in _shard_trackers}
+    overlap_reports = get_shard_reports()
+    frames_read = 0
+    for chunk in read_video_range(video_path, start_frame, end_frame, chunk_size):
+        # the overlapping frames are detected on their own, so the reports can be read right after them
+        split = min(max(overlap - frames_read, 0), len(chunk))
+        for frames in (chunk[:split], chunk[split:]):
+            if not frames:
+                continue
+            for name, tracker in _shard_trackers.items():
+                chunk_detections[name].append(
+                    tracker.detect_frames(frames, batch_size=batch_size, **detect_params.get(name, {}))
+                )
+            frames_read += len(frames)
+            if frames_read == overlap:
+                overlap_reports = get_shard_reports()
+
+    stores = {name: TrackStore.concatenate(stores) for name, stores in chunk_detections.items()}
+    reports = {
+        name: {key: count - overlap_reports[name][key] for key, count in report.items()}
+        for name, report in get_shard_reports().items()
+    }
+    return stores, reports
+
+
+# =======================================================
+#   STITCHING
+# =======================================================
+def match_shard_tracks(previous_overlap, current_overlap, iou_threshold=0.5):
+    """
+    Map the track ids of current_overlap to those of previous_overlap, two
+    stores over the same frames. Pairs are scored by their mean IoU over the
+    frames the current track appears in and matched greedily, best first;
+    tracks scoring below iou_threshold stay unmatched.
+    """
+    iou_sums = {}
+    frame_counts = {}
+    for frame_num in range(current_overlap.num_frames):
+        previous_ids, previous_bboxes = previous_overlap.get_frame(frame_num)
+        current_ids, current_bboxes = current_overlap.get_frame(frame_num)
+        for current_id in current_ids.tolist():
+            frame_counts[current_id] = frame_counts.get(current_id, 0) + 1
+        if len(previous_ids) == 0 or len(current_ids) == 0:
+            continue
+
+        ious = get_bbox_ious(current_bboxes, previous_bboxes)
+        for i, current_id in enumerate(current_ids.tolist()):
+            for j, previous_id in enumerate(previous_ids.tolist()):
+                pair = (current_id, previous_id)
+                iou_sums[pair] = iou_sums.get(pair, 0.0) + ious[i, j]
+
+    scores = sorted(
+        ((iou_sum / frame_counts[current_id], current_id, previous_id)
+         for (current_id, previous_id), iou_sum in iou_sums.items()),
+        reverse=True
+    )
+    mapping = {}
+    used_previous_ids = set()
+    for score, current_id, previous_id in scores:
+        if score < iou_threshold:
+            break
+        if current_id in mapping or previous_id in used_previous_ids:
+            continue
+        mapping[current_id] = previous_id
+        used_previous_ids.add(previous_id)
+    return mapping
+
+
+def stitch_shards(shard_stores, shard_starts, match_tracks=True, iou_threshold=0.5):
+    """
+    Join per-shard TrackStores into one over the whole video. The frames two
+    shards share are taken from the earlier shard, whose tracker is already
+    warmed up there. With match_tracks, each later shard's track ids are
+    reconciled with the earlier ones over the shared frames; tracks that
+    match nothing get new ids above every id used so far.
+    """
+    stitched = [shard_stores[0]]
+    num_frames = shard_stores[0].num_frames
+    next_track_id = int(shard_stores[0].track_ids.max(initial=0)) + 1
+
+    for store, start in zip(shard_stores[1:], shard_starts[1:]):
+        if store.num_frames == 0:
+            # started past the real end of the video (the header count was high)
+            continue
+        if start > num_frames:
+            raise ValueError(f"Shard starting at frame {start} leaves a gap after frame {num_frames}")
+        # frames of this shard already covered by the previous ones
+        overlap = min(num_frames - start, store.num_frames)
+
+        if match_tracks:
+            previous_overlap = TrackStore.concatenate(stitched).slice_frames(start, num_frames)
+            mapping = match_shard_tracks(previous_overlap, store.slice_frames(0, overlap), iou_threshold)
+            for track_id in store.get_track_ids():
+                if track_id not in mapping:
+                    mapping[track_id] = next_track_id
+                    next_track_id += 1
+            store = store.remap_track_ids(mapping)
+
+        stitched.append(store.slice_frames(overlap))
+        num_frames += store.num_frames - overlap
+
+    return TrackStore.concatenate(stitched)
+
+
+def detect_sharded(video_path, trackers, num_frames, num_shards, overlap=32, batch_size=1,
+                   chunk_size=64, match_tracks=None, detect_params=None, progress_callback=None):
+    """
+    Detections for a whole video from num_shards overlapping frame ranges
+    processed in parallel worker processes, each with its own copy of the
+    trackers and an equal share of the cores. trackers maps a name to a
+    tracker; match_tracks lists the names whose ids need reconciling across
+    shards (by default all of them) and detect_params holds extra
+    detect_frames arguments per name. Returns {name: TrackStore}; the
+    workers' inference counts are added to the trackers passed in.
+    """
+    if match_tracks is None:
+        match_tracks = list(trackers)
+
+    shard_ranges = get_shard_ranges(num_frames, num_shards, overlap)
+    # frames each shard shares with the previous one
+    shard_overlaps = [0] + [previous_end - start for (_, previous_end), (start, _) in zip(shard_ranges, shard_ranges[1:])]
+    tracker_specs = {
+        name: (type(tracker), tracker.model_path, tracker.inference_params)
+        for name, tracker in trackers.items()
+    }
+    num_threads = max(1, (os.cpu_count() or 1) // len(shard_ranges))
+
+    shard_results = [None] * len(shard_ranges)
+    frames_processed = 0
+    # spawn, not fork: torch and OpenCV thread pools don't survive a fork
+    with ProcessPoolExecutor(
+        max_workers=len(shard_ranges),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_shard_worker,
+        initargs=(num_threads, tracker_specs),
+    ) as executor:
+        futures = {
+            executor.submit(detect_shard, video_path, start, end, batch_size, chunk_size, detect_params,
+                            shard_overlaps[shard_num]): shard_num
+            for shard_num, (start, end) in enumerate(shard_ranges)
+        }
+        for future in as_completed(futures):
+            shard_num = futures[future]
+            shard_results[shard_num], shard_reports = future.result()
+            for name, report in shard_reports.items():
+                trackers[name].merge_detection_report(report)
+            frames_processed += next(iter(shard_results[shard_num].values())).num_frames - shard_overlaps[shard_num]
+            if progress_callback is not None:
+                progress_callback(min(frames_processed, num_frames))
+
+    shard_starts = [start for start, _ in shard_ranges]
+    return {
+        name: stitch_shards(
+            [shard_result[name] for shard_result in shard_results],
+            shard_starts,
+            match_tracks=name in match_tracks
+        )
+        for name in trackers
+    }
@@ -0,0 +1,212 @@
+import numpy as np
+
+
+class TrackStore:
+    """
+    Detections of a whole video as flat NumPy columns (structure of arrays)
+    instead of a list of per-frame {track_id: [x1, y1, x2, y2]} dicts.
+
+    Rows are grouped by frame: rows frame_offsets[f]:frame_offsets[f+1] are
+    the detections of frame f, so slicing out a frame is O(1).
+      track_ids   (K,)   int64
+      coords      (K, 4) float64 boxes [x1, y1, x2, y2], or (K, 2) points [x, y]
+      confidences (K,)   float32, NaN when unknown
+      valid       (K,)   bool, False for placeholder rows (e.g. frames that
+                         interpolation did not fill)
+    """
+    def __init__(self, frame_offsets, track_ids, coords, confidences=None, valid=None):
+        self.frame_offsets = np.asarray(frame_offsets, dtype=np.int64)
+        self.track_ids = np.asarray(track_ids, dtype=np.int64)
+        coords = np.asarray(coords, dtype=np.float64)
+        self.coords = coords if coords.ndim == 2 else coords.reshape(-1, 4)
+
+        num_rows = len(self.track_ids)
+        if confidences is None:
+            confidences = np.full(num_rows, np.nan, dtype=np.float32)
+        if valid is None:
+            valid = np.ones(num_rows, dtype=bool)
+        self.confidences = np.asarray(confidences, dtype=np.float32)
+        self.valid = np.asarray(valid, dtype=bool)
+        self.all_valid = bool(self.valid.all())
+
+        self._frame_nums = None
+        self._track_rows = None
+
+    # =======================================================
+    #   BUILDING
+    # =======================================================
+    @classmethod
+    def empty(cls, num_frames=0, width=4):
+        return cls(np.zeros(num_frames + 1, dtype=np.int64), [], np.empty((0, width)))
+
+    @classmethod
+    def from_frame_arrays(cls, frame_arrays, width=4):
+        """Build from a list with one (track_ids, coords, confidences) tuple per frame."""
+        frame_offsets = np.zeros(len(frame_arrays) + 1, dtype=np.int64)
+        frame_offsets[1:] = np.cumsum([len(track_ids) for track_ids, _, _ in frame_arrays])
+        if frame_offsets[-1] == 0:
+            return cls.empty(len(frame_arrays), width)
+        return cls(
+            frame_offsets,
+            np.concatenate([track_ids for track_ids, _, _ in frame_arrays]),
+            np.concatenate([np.asarray(coords, dtype=np.float64).reshape(-1, width) for _, coords, _ in frame_arrays]),
+            np.concatenate([confidences for _, _, confidences in frame_arrays]),
+        )
+
+    @classmethod
+    def from_detections(cls, detections, width=4):
+        """Build from the list of per-frame dicts; None entries are skipped."""
+        frame_offsets = np.zeros(len(detections) + 1, dtype=np.int64)
+        track_ids = []
+        coords = []
+        for frame_num, frame_detections in enumerate(detections):
+            if isinstance(frame_detections, dict):
+                for track_id, coord in frame_detections.items():
+                    if coord is None:
+                        continue
+                    track_ids.append(track_id)
+                    coords.append(coord)
+            frame_offsets[frame_num + 1] = len(track_ids)
+        return cls(frame_offsets, track_ids, np.asarray(coords, dtype=np.float64).reshape(-1, width))
+
+    @classmethod
+    def from_dense(cls, track_id, coords, valid=None):
+        """One row per frame for a single track, e.g. the ball; valid marks real rows."""
+        coords = np.asarray(coords, dtype=np.float64)
+        num_frames = len(coords)
+        if valid is None:
+            valid = np.isfinite(coords).all(axis=1)
+        return cls(
+            np.arange(num_frames + 1),
+            np.full(num_frames, track_id),
+            coords,
+            valid=valid,
+        )
+
+    @classmethod
+    def concatenate(cls, stores):
+        """Join stores covering consecutive frame ranges into one."""
+        if not stores:
+            return cls.empty()
+        frame_offsets = [stores[0].frame_offsets[:1]]
+        row_offset = 0
+        for store in stores:
+            frame_offsets.append(store.frame_offsets[1:] + row_offset)
+            row_offset += len(store.track_ids)
+        return cls(
+            np.concatenate(frame_offsets),
+            np.concatenate([store.track_ids for store in stores]),
+            np.concatenate([store.coords for store in stores]),
+            np.concatenate([store.confidences for store in stores]),
+            np.concatenate([store.valid for store in stores]),
+        )
+
+    # =======================================================
+    #   ACCESS
+    # =======================================================
+    @property
+    def num_frames(self):
+        return len(self.frame_offsets) - 1
+
+    def __len__(self):
+        return self.num_frames
+
+    @property
+    def frame_nums(self):
+        # frame number of every row
+        if self._frame_nums is None:
+            self._frame_nums = np.repeat(np.arange(self.num_frames), np.diff(self.frame_offsets))
+        return self._frame_nums
+
+    def get_frame(self, frame_num):
+        """(track_ids, coords) of the valid detections in a frame, as views when possible."""
+        start, end = self.frame_offsets[frame_num], self.frame_offsets[frame_num + 1]
+        if self.all_valid:
+            return self.track_ids[start:end], self.coords[start:end]
+        valid = self.valid[start:end]
+        return self.track_ids[start:end][valid], self.coords[start:end][valid]
+
+    def get_frame_dict(self, frame_num):
+        track_ids, coords = self.get_frame(frame_num)
+        return dict(zip(track_ids.tolist(), coords.tolist()))
+
+    def get_track_ids(self):
+        return np.unique(self.track_ids[self.valid]).tolist()
+
+    def get_track(self, track_id):
+        """(frame_nums, coords) of one track's valid rows, in frame order."""
+        if self._track_rows is None:
+            # group row indices by track once; every later lookup is a dict hit
+            order = np.argsort(self.track_ids, kind='stable')
+            unique_ids, starts = np.unique(self.track_ids[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            self._track_rows = {
+                track: order[start:end]
+                for track, start, end in zip(unique_ids.tolist(), starts, ends)
+            }
+        rows = self._track_rows.get(track_id, np.empty(0, dtype=np.int64))
+        rows = rows[self.valid[rows]]
+        return self.frame_nums[rows], self.coords[rows]
+
+    def get_dense_track(self, track_id):
+        """(num_frames, D) coords of one track, NaN where it is missing, plus a validity mask."""
+        frame_nums, coords = self.get_track(track_id)
+        dense = np.full((self.num_frames, self.coords.shape[1]), np.nan)
+        dense[frame_nums] = coords
+        present = np.zeros(self.num_frames, dtype=bool)
+        present[frame_nums] = True
+        return dense, present
+
+    # =======================================================
+    #   DERIVED STORES
+    # =======================================================
+    def filter_tracks(self, track_ids):
+        keep = np.isin(self.track_ids, list(track_ids))
+        return self.select_rows(keep)
+
+    def select_rows(self, keep):
+        counts = np.bincount(self.frame_nums[keep], minlength=self.num_frames)
+        frame_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return TrackStore(frame_offsets, self.track_ids[keep], self.coords[keep],
+                          self.confidences[keep], self.valid[keep])
+
+    def slice_frames(self, start, end=None):
+        """Frames start:end as a new store, renumbered from 0."""
+        frame_offsets = self.frame_offsets[start:None if end is None else end + 1]
+        row_start, row_end = frame_offsets[0], frame_offsets[-1]
+        return TrackStore(frame_offsets - row_start, self.track_ids[row_start:row_end],
+                          self.coords[row_start:row_end], self.confidences[row_start:row_end],
+                          self.valid[row_start:row_end])
+
+    def remap_track_ids(self, mapping):
+        """Same rows with track ids replaced through mapping; ids not in it are kept."""
+        unique_ids, inverse = np.unique(self.track_ids, return_inverse=True)
+        new_ids = np.array([mapping.get(track_id, track_id) for track_id in unique_ids.tolist()], dtype=np.int64)
+        return TrackStore(self.frame_offsets, new_ids[inverse].reshape(-1), self.coords,
+                          self.confidences, self.valid)
+
+    def with_coords(self, coords, valid=None):
+        """Same rows, new coordinates (e.g. boxes projected to mini court points)."""
+        return TrackStore(self.frame_offsets, self.track_ids, coords, self.confidences,
+                          self.valid if valid is None else valid)
+
+    def pad_frames(self, num_frames):
+        """Extend with empty frames up to num_frames."""
+        if num_frames <= self.num_frames:
+            return self
+        padding = np.full(num_frames - self.num_frames, self.frame_offsets[-1])
+        return TrackStore(np.concatenate([self.frame_offsets, padding]), self.track_ids,
+                          self.coords, self.confidences, self.valid)
+
+    def to_detections(self, as_tuples=False):
+        """Back to the list of per-frame dicts; invalid rows become None."""
+        coords = self.coords.tolist()
+        if as_tuples:
+            coords = [tuple(coord) for coord in coords]
+        track_ids = self.track_ids.tolist()
+        valid = self.valid.tolist()
+        offsets = self.frame_offsets.tolist()
+        return [
+            {track_ids[row]: coords[row] if valid[row] else None for row in range(start, end)}
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
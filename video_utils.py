@@ -11,9 +11,101 @@ def read_video(video_path):
     cap.release()
     return frames
 
-def save_video(output_video_frames, output_video_path):
+def read_video_chunks(video_path, chunk_size=64):
+    """
+    Lazily decode a video and yield lists of at most 'chunk_size' frames.
+    Only one chunk is held in memory at a time, so peak memory does not
+    depend on the length of the video.
+    """
+    cap = cv2.VideoCapture(video_path)
+    chunk = []
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            chunk.append(frame)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        cap.release()
+
+def read_video_range(video_path, start_frame, end_frame=None, chunk_size=64):
+    """
+    read_video_chunks for frames start_frame:end_frame only (end_frame=None
+    reads to the end of the video).
+    """
+    cap = seek_video(video_path, start_frame)
+    frame_num = start_frame
+    chunk = []
+    try:
+        while end_frame is None or frame_num < end_frame:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_num += 1
+            chunk.append(frame)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        cap.release()
+
+def seek_video(video_path, start_frame):
+    """
+    A VideoCapture whose next read() returns frame start_frame. Seeking with
+    CAP_PROP_POS_FRAMES is not frame-exact for every codec and backend, so
+    when the capture doesn't report the requested position the video is
+    reopened and the frames before start_frame are skipped one by one.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if start_frame == 0:
+        return cap
+    if cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start_frame:
+        return cap
+
+    cap.release()
+    cap = cv2.VideoCapture(video_path)
+    for _ in range(start_frame):
+        # grab() decodes without converting the frame, cheaper than read()
+        if not cap.grab():
+            break
+    return cap
+
+def get_video_properties(video_path):
+    # frame_count comes from the container header and can be approximate
+    cap = cv2.VideoCapture(video_path)
+    properties = {
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
+    cap.release()
+    return properties
+
+def encode_jpeg(frame, max_width=None):
+    """JPEG bytes of a frame, scaled down to max_width if it is wider."""
+    if max_width is not None and frame.shape[1] > max_width:
+        height = round(frame.shape[0] * max_width / frame.shape[1])
+        frame = cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", frame)
+    if not ok:
+        raise RuntimeError("Could not encode the frame as JPEG")
+    return buffer.tobytes()
+
+def create_video_writer(output_video_path, frame_size, fps=24):
+    # frame_size is (width, height)
     fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
+    return cv2.VideoWriter(output_video_path, fourcc, fps, frame_size)
+
+def save_video(output_video_frames, output_video_path):
+    out = create_video_writer(output_video_path, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
     for frame in output_video_frames:
         out.write(frame)
-    out.release()
\ No newline at end of file
+    out.release()
@@ -0,0 +1,160 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+# name: (backend, codec, container)
+VIDEO_CODECS = {
+    'mjpg': ('opencv', 'MJPG', '.avi'),
+    'xvid': ('opencv', 'XVID', '.avi'),
+    'mp4v': ('opencv', 'mp4v', '.mp4'),
+    'h264': ('ffmpeg', 'libx264', '.mp4'),
+    'h265': ('ffmpeg', 'libx265', '.mp4'),
+    'vp9': ('ffmpeg', 'libvpx-vp9', '.webm'),
+}
+
+_STOP = object()
+
+
+def get_output_video_path(output_video_path, codec):
+    """output_video_path with the extension of the codec's container."""
+    container = VIDEO_CODECS[codec][2]
+    return os.path.splitext(output_video_path)[0] + container
+
+
+class BackgroundVideoWriter:
+    """
+    Encodes frames on a background thread fed through a bounded queue, so
+    rendering the next frames overlaps with encoding the previous ones. The
+    queue holds at most queue_size frames; write() blocks when it is full.
+
+    'opencv' codecs go through cv2.VideoWriter, 'ffmpeg' ones are piped as
+    raw BGR frames into a local ffmpeg process. Frames must not be changed
+    after they are passed to write().
+    """
+    def __init__(self, output_video_path, frame_size, fps=24, codec='mjpg', queue_size=32):
+        # frame_size is (width, height)
+        if codec not in VIDEO_CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {sorted(VIDEO_CODECS)}")
+        self.output_video_path = output_video_path
+        self.frame_size = frame_size
+        self.fps = fps
+        self.codec = codec
+        self.backend, self.codec_name, _ = VIDEO_CODECS[codec]
+
+        self.frames_written = 0
+        self.encode_seconds = 0.0
+        self.error = None
+        self.released = False
+        self.aborted = False
+
+        if self.backend == 'opencv':
+            self.writer = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*self.codec_name), fps, frame_size)
+            if not self.writer.isOpened():
+                raise RuntimeError(f"OpenCV cannot write {self.codec_name} to {output_video_path}")
+        else:
+            self.writer = self.start_ffmpeg()
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run_encoder, name="video-writer", daemon=True)
+        self.thread.start()
+
+    def start_ffmpeg(self):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError(f"The {self.codec} codec needs ffmpeg on the PATH")
+        width, height = self.frame_size
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(self.fps),
+            "-i", "-",
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", self.codec_name, "-pix_fmt", "yuv420p",
+            self.output_video_path,
+        ]
+        return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def run_encoder(self):
+        while True:
+            frame = self.frames.get()
+            if frame is _STOP:
+                return
+            if self.error is not None or self.aborted:
+                # keep draining so write() never blocks on a dead encoder
+                continue
+            start = time.perf_counter()
+            try:
+                if self.backend == 'opencv':
+                    self.writer.write(frame)
+                else:
+                    self.writer.stdin.write(frame.tobytes())
+                self.frames_written += 1
+            except Exception as e:
+                self.error = e
+            self.encode_seconds += time.perf_counter() - start
+
+    def write(self, frame):
+        if self.error is not None:
+            raise RuntimeError(f"Video encoding failed: {self.error}") from self.error
+        self.frames.put(frame)
+
+    def release(self):
+        """Wait for the queued frames to be encoded, close the file and return get_report()."""
+        self.released = True
+        self.frames.put(_STOP)
+        self.thread.join()
+
+        start = time.perf_counter()
+        if self.backend == 'opencv':
+            self.writer.release()
+        else:
+            self.writer.stdin.close()
+            if self.writer.wait() != 0 and self.error is None:
+                self.error = RuntimeError(f"ffmpeg exited with code {self.writer.returncode}")
+        self.encode_seconds += time.perf_counter() - start
+
+        if self.error is not None:
+            raise RuntimeError(f"Video encoding failed: {self.error}") from self.error
+        return self.get_report()
+
+    def abort(self):
+        """
+        Stop the encoder without encoding the queued frames and close the file
+        or kill ffmpeg, e.g. when rendering failed. The output is left
+        incomplete. Does nothing after release().
+        """
+        if self.released:
+            return
+        self.released = True
+        self.aborted = True
+        self.frames.put(_STOP)
+        self.thread.join()
+
+        if self.backend == 'opencv':
+            self.writer.release()
+        else:
+            self.writer.kill()
+            try:
+                self.writer.stdin.close()
+            except OSError:
+                # frames still buffered for the pipe can't be flushed to a killed process
+                pass
+            self.writer.wait()
+
+    def get_report(self):
+        footage_minutes = self.frames_written / self.fps / 60 if self.fps else 0
+        output_bytes = os.path.getsize(self.output_video_path) if os.path.exists(self.output_video_path) else 0
+        return {
+            'output_video_path': self.output_video_path,
+            'codec': self.codec,
+            'frames': self.frames_written,
+            'fps': self.fps,
+            'output_bytes': output_bytes,
+            'encode_seconds': self.encode_seconds,
+            'bytes_per_minute': output_bytes / footage_minutes if footage_minutes else None,
+            'encode_seconds_per_minute': self.encode_seconds / footage_minutes if footage_minutes else None,
+        }